@@ -528,8 +528,8 @@ def init_app(app):
     if not os.path.exists(no_image_path):
         try:
             import shutil
-            import requests
-            response = requests.get('https://raw.githubusercontent.com/common-resources/placeholder-images/main/no-image-available.png', stream=True)
+            from utils.http_client import http_get
+            response = http_get('https://raw.githubusercontent.com/common-resources/placeholder-images/main/no-image-available.png', stream=True)
             if response.status_code == 200:
                 with open(no_image_path, 'wb') as f:
                     shutil.copyfileobj(response.raw, f)
@@ -7,7 +7,10 @@ import logging
 
 # Import config and database
 from config.database import DB_CONFIG
+from config.ocr import OCR_SETTINGS
 from database.db import init_app
+from utils.off_mirror import get_product_store
+from utils.off_sync import start_delta_sync
 
 # Import cart blueprint
 from cart import CartBlueprint
@@ -31,6 +34,8 @@ app.config.update(DB_CONFIG)
 # Configuration for file upload
 UPLOAD_FOLDER = os.path.join('src', 'static', 'uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Reject oversized request bodies before they are buffered (1 MB headroom for the other form fields)
+app.config['MAX_CONTENT_LENGTH'] = OCR_SETTINGS['MAX_UPLOAD_BYTES'] * OCR_SETTINGS['MAX_UPLOAD_FRAMES'] + 1024 * 1024
 
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -43,6 +48,10 @@ bcrypt = Bcrypt(app)
 # Initialize database
 init_app(app)
 
+# Keep the local Open Food Facts mirror current from the daily delta exports (if enabled)
+if get_product_store() is not None:
+    start_delta_sync(get_product_store())
+
 @app.before_request
 def before_request():
     """Set up extensions for request."""
@@ -0,0 +1,3 @@
+"""
+Performance benchmarks. Run each module from the src directory with python -m.
+"""
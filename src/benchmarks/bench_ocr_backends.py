@@ -0,0 +1,65 @@
+"""
+Per-call overhead of the OCR backends.
+
+Renders a synthetic nutrition label and times repeated OCR passes with each
+installed backend. The first call is reported separately since it includes
+loading the language model; the pytesseract backend pays that on every call.
+
+Run from the src directory:
+    python -m benchmarks.bench_ocr_backends [--calls N]
+"""
+import argparse
+import statistics
+import time
+import cv2
+import numpy as np
+from utils.image_processing import TESSERACT_OPTIONS
+from utils.ocr_backends import BACKENDS
+
+LABEL_LINES = [
+    "NUTRITION INFORMATION Per 100g",
+    "Energy 466 kcal",
+    "Protein 6.9 g",
+    "Carbohydrate 72.5 g",
+    "Sugars 26.4 g",
+    "Total Fat 16.5 g",
+    "Saturated Fat 7.8 g",
+    "Sodium 310 mg",
+]
+
+def _render_label():
+    img = np.full((60 + 50 * len(LABEL_LINES), 900), 255, np.uint8)
+    for i, line in enumerate(LABEL_LINES):
+        cv2.putText(img, line, (30, 60 + 50 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.1, 0, 2, cv2.LINE_AA)
+    return img
+
+def _time_backend(backend, img, calls):
+    start = time.perf_counter()
+    backend.image_to_string(img, TESSERACT_OPTIONS)
+    first = time.perf_counter() - start
+
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        backend.image_to_string(img, TESSERACT_OPTIONS)
+        timings.append(time.perf_counter() - start)
+    return first, statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=20, help='timed calls per backend')
+    args = parser.parse_args()
+
+    img = _render_label()
+    print(f"{'backend':<16}{'first call ms':>16}{'median ms':>12}")
+    for name, backend_class in BACKENDS.items():
+        try:
+            backend = backend_class()
+            first, median = _time_backend(backend, img, args.calls)
+        except Exception as e:
+            print(f"{name:<16}  unavailable: {str(e)}")
+            continue
+        print(f"{name:<16}{first * 1000:>16.1f}{median * 1000:>12.1f}")
+
+if __name__ == '__main__':
+    main()
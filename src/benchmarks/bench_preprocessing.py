@@ -0,0 +1,69 @@
+"""
+Latency and peak memory of building the preprocessing variants.
+
+Renders a synthetic nutrition label at several photo sizes and builds every
+variant in PREPROCESS_VARIANTS, with and without resolution normalization.
+Peak memory is the largest amount of NumPy memory held while building, as
+reported by tracemalloc.
+
+Run from the src directory:
+    python -m benchmarks.bench_preprocessing [--sizes 1 4 12 24 48]
+"""
+import argparse
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from utils.image_processing import PreprocessedImages, PREPROCESS_VARIANTS
+
+LABEL_LINES = [
+    "NUTRITION INFORMATION Per 100g",
+    "Energy 466 kcal",
+    "Protein 6.9 g",
+    "Carbohydrate 72.5 g",
+    "Sugars 26.4 g",
+    "Total Fat 16.5 g",
+    "Saturated Fat 7.8 g",
+    "Sodium 310 mg",
+]
+
+def _render_photo(megapixels):
+    """A 4:3 photo of the given size with the label text scaled to fit it."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    img = np.full((height, width, 3), 235, np.uint8)
+
+    scale = width / 900
+    for i, line in enumerate(LABEL_LINES):
+        origin = (int(40 * scale), int((60 + 70 * i) * scale))
+        cv2.putText(img, line, origin, cv2.FONT_HERSHEY_SIMPLEX, 1.1 * scale, (20, 20, 20),
+                    max(int(2 * scale), 1), cv2.LINE_AA)
+    return img
+
+def _measure(image, normalize):
+    tracemalloc.start()
+    start = time.perf_counter()
+    variants = PreprocessedImages(image, normalize=normalize)
+    for name in PREPROCESS_VARIANTS:
+        variants.get(name)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, variants.get('resized').shape
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 12, 24, 48],
+                        help='photo sizes in megapixels')
+    args = parser.parse_args()
+
+    print(f"{'MP':>5}  {'mode':<12}{'working size':>14}{'ms':>10}{'peak MB':>10}")
+    for megapixels in args.sizes:
+        image = _render_photo(megapixels)
+        for label, normalize in (('legacy', False), ('normalized', True)):
+            elapsed, peak, shape = _measure(image, normalize)
+            size = f"{shape[1]}x{shape[0]}"
+            print(f"{megapixels:>5g}  {label:<12}{size:>14}{elapsed * 1000:>10.1f}{peak / 2**20:>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+OCR pipeline settings.
+"""
+import os
+
+# Web worker processes serving the app on this host; set it to gunicorn's --workers
+WEB_WORKERS = max(1, int(os.environ.get('EATFIT_WEB_WORKERS', 1)))
+
+OCR_SETTINGS = {
+    'WEB_WORKERS': WEB_WORKERS,
+    # Worker processes each web worker uses to run tesseract passes in parallel (1 runs them inline).
+    # Every web worker has its own pool, so the default splits the host's CPUs between the
+    # web workers instead of giving each all of them.
+    'POOL_SIZE': int(os.environ.get('EATFIT_OCR_WORKERS', max(1, (os.cpu_count() or 1) // WEB_WORKERS))),
+    # Wall-clock budget per upload in seconds; best-so-far values are returned when it expires
+    'TIME_BUDGET': float(os.environ.get('EATFIT_OCR_TIME_BUDGET', 20)),
+    # 'tesserocr' keeps an engine loaded in-process, 'pytesseract' runs the tesseract binary per pass,
+    # 'auto' uses tesserocr when it is installed
+    'BACKEND': os.environ.get('EATFIT_OCR_BACKEND', 'auto'),
+    # Directory with the tesseract traineddata; None uses tesseract's own (or TESSDATA_PREFIX)
+    'TESSDATA_DIR': os.environ.get('EATFIT_TESSDATA_DIR'),
+
+    # Per-file upload cap; MAX_CONTENT_LENGTH (derived from it) caps the whole request body
+    'MAX_UPLOAD_BYTES': int(os.environ.get('EATFIT_MAX_UPLOAD_MB', 10)) * 1024 * 1024,
+    # Uploads are downscaled to this longer side (pixels) when decoded
+    'DECODE_MAX_SIDE': int(os.environ.get('EATFIT_OCR_DECODE_MAX_SIDE', 2000)),
+
+    # Quality gate: uploads failing these checks are rejected with retake advice instead of OCR'd
+    'QUALITY_GATE': os.environ.get('EATFIT_OCR_QUALITY_GATE', '1') == '1',
+    'MIN_SHARPNESS': float(os.environ.get('EATFIT_OCR_MIN_SHARPNESS', 50)),  # Variance of the Laplacian
+    'MIN_BRIGHTNESS': 40,  # Mean grey level (0-255)
+    # Overexposed when more than MAX_CLIPPED of the pixels are at CLIP_LEVEL or brighter; a bright
+    # mean alone is normal for a white label
+    'CLIP_LEVEL': 250,
+    'MAX_CLIPPED': 0.5,
+    'MIN_CONTRAST': 40,  # Grey-level spread between the 1st and 99th percentiles
+    # Clients may send several frames of the label; the sharpest one is used
+    'MAX_UPLOAD_FRAMES': 3,
+
+    # Images are resized so text is about this many pixels tall before preprocessing...
+    'TARGET_TEXT_HEIGHT': int(os.environ.get('EATFIT_OCR_TEXT_HEIGHT', 30)),
+    # ...while keeping the longer side within these bounds (pixels)
+    'MIN_SIDE': 800,
+    'MAX_SIDE': int(os.environ.get('EATFIT_OCR_MAX_SIDE', 1600)),
+
+    # Crop uploads to the detected nutrition table and straighten it before preprocessing
+    'TABLE_DETECTION': os.environ.get('EATFIT_OCR_TABLE_DETECTION', '1') == '1',
+    # Bounds on the table area as a fraction of the frame; regions outside them are ignored
+    'TABLE_MIN_AREA': 0.05,
+    'TABLE_MAX_AREA': 0.95,
+    # Rotate labels whose text lines are tilted by more than MIN_SKEW degrees (up to MAX_SKEW)
+    'MIN_SKEW': 0.5,
+    'MAX_SKEW': 30,
+
+    # OCR profile used when a request does not ask for one: 'fast', 'balanced' or 'accurate'.
+    # 'accurate' is the full variant x config grid the scanner always ran; set 'balanced' to trade
+    # some accuracy on hard labels for much faster scans.
+    'PROFILE': os.environ.get('EATFIT_OCR_PROFILE', 'accurate'),
+    # Profiles a request may ask for; add 'accurate' on deployments where exhaustive extraction is allowed
+    'REQUEST_PROFILES': os.environ.get('EATFIT_OCR_REQUEST_PROFILES', 'fast,balanced').split(','),
+    # Per-profile time budgets in seconds overriding the defaults in OCR_PROFILES, e.g. {'fast': 3}
+    'PROFILE_BUDGETS': {},
+    # Directory with the fast (integer) traineddata used by the 'fast' profile; None uses TESSDATA_DIR
+    'FAST_TESSDATA_DIR': os.environ.get('EATFIT_FAST_TESSDATA_DIR'),
+    # Minimum tesseract word confidence (0-100) for a value to count as found in adaptive mode
+    'MIN_CONFIDENCE': float(os.environ.get('EATFIT_OCR_MIN_CONFIDENCE', 60)),
+    # Fraction of uploads whose preprocessing variants are written to debug_images/ (0 disables)
+    'DEBUG_SAMPLE_RATE': float(os.environ.get('EATFIT_OCR_DEBUG_SAMPLE_RATE', 0)),
+    # Per-variant success statistics used to order adaptive passes (SQLite, shared by all workers)
+    'STATS_PATH': os.environ.get(
+        'EATFIT_OCR_STATS_PATH',
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'ocr_variant_stats.sqlite3')
+    ),
+
+    # Background OCR jobs: 'sqlite' shares jobs between the web workers on this host; 'memory' only
+    # works with a single web worker and is replaced by 'sqlite' when WEB_WORKERS is more than 1
+    'JOB_BACKEND': os.environ.get('EATFIT_OCR_JOB_BACKEND', 'sqlite'),
+    'JOB_WORKERS': int(os.environ.get('EATFIT_OCR_JOB_WORKERS', 2)),
+    'JOB_DB_PATH': os.environ.get(
+        'EATFIT_OCR_JOB_DB_PATH',
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'ocr_jobs.sqlite3')
+    ),
+    'JOB_TTL': 60 * 60,  # Finished jobs are forgotten after an hour
+    # Pending or running jobs with no progress for this many seconds are reported as failed
+    # (the worker process running them has died or restarted)
+    'JOB_TIMEOUT': int(os.environ.get('EATFIT_OCR_JOB_TIMEOUT', 300)),
+
+    # On-disk OCR result cache keyed by perceptual hash of the table region and barcode
+    'RESULT_CACHE_ENABLED': os.environ.get('EATFIT_OCR_RESULT_CACHE', '1') == '1',
+    'RESULT_CACHE_PATH': os.environ.get(
+        'EATFIT_OCR_RESULT_CACHE_PATH',
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'ocr_results.sqlite3')
+    ),
+    'RESULT_CACHE_SIZE': int(os.environ.get('EATFIT_OCR_RESULT_CACHE_SIZE', 2000)),
+    # Maximum number of differing bits (of 256) for two table crops to count as the same label; at most 7
+    'RESULT_CACHE_MAX_DISTANCE': 4,
+}
@@ -0,0 +1,62 @@
+"""
+Open Food Facts API, product cache and local mirror settings.
+"""
+import os
+
+OFF_CONFIG = {
+    'BASE_URL': os.environ.get('EATFIT_OFF_BASE_URL', 'https://world.openfoodfacts.org'),
+    'USER_AGENT': 'EatFit.ai/1.0 (https://github.com/TejasDeshmukh13/EatFit.ai)',
+
+    # Shared HTTP session: timeouts in seconds, pool sizes and retry/backoff
+    'CONNECT_TIMEOUT': float(os.environ.get('EATFIT_OFF_CONNECT_TIMEOUT', 3.05)),
+    'READ_TIMEOUT': float(os.environ.get('EATFIT_OFF_READ_TIMEOUT', 10)),
+    'POOL_CONNECTIONS': 4,  # Number of distinct hosts to keep pools for
+    'POOL_MAXSIZE': int(os.environ.get('EATFIT_OFF_POOL_MAXSIZE', 16)),  # Connections kept per host
+    'MAX_RETRIES': int(os.environ.get('EATFIT_OFF_MAX_RETRIES', 2)),
+    'BACKOFF_FACTOR': 0.5,  # Sleeps 0.5s, 1s, 2s... between retries
+    'RETRY_STATUSES': (429, 500, 502, 503, 504),
+
+    # Alternatives lookup: concurrent category searches and overall time budget (seconds)
+    'SEARCH_MAX_WORKERS': int(os.environ.get('EATFIT_SEARCH_MAX_WORKERS', 8)),
+    'ALTERNATIVES_DEADLINE': float(os.environ.get('EATFIT_ALTERNATIVES_DEADLINE', 12)),
+
+    # Shared cache of processed products returned by get_product_from_off
+    'PRODUCT_CACHE_SIZE': int(os.environ.get('EATFIT_PRODUCT_CACHE_SIZE', 1024)),
+    'PRODUCT_CACHE_TTL': int(os.environ.get('EATFIT_PRODUCT_CACHE_TTL', 6 * 60 * 60)),  # 6 hours
+    # Expired products are still served (and refreshed in the background) for this long; 0 disables
+    'PRODUCT_CACHE_MAX_STALE': int(os.environ.get('EATFIT_PRODUCT_CACHE_MAX_STALE', 7 * 24 * 60 * 60)),  # 7 days
+
+    # Barcodes Open Food Facts confirmed it does not know, so repeat misses skip the network
+    'NOT_FOUND_CACHE_SIZE': int(os.environ.get('EATFIT_NOT_FOUND_CACHE_SIZE', 4096)),
+    'NOT_FOUND_CACHE_TTL': int(os.environ.get('EATFIT_NOT_FOUND_CACHE_TTL', 24 * 60 * 60)),  # 1 day
+
+    # Category search cache used by the alternatives lookup (products use the product cache above)
+    'SEARCH_CACHE_SIZE': int(os.environ.get('EATFIT_SEARCH_CACHE_SIZE', 256)),
+    'SEARCH_CACHE_TTL': int(os.environ.get('EATFIT_SEARCH_CACHE_TTL', 60 * 60)),  # 1 hour
+    'SEARCH_CACHE_MAX_STALE': int(os.environ.get('EATFIT_SEARCH_CACHE_MAX_STALE', 24 * 60 * 60)),  # 1 day
+
+    # Coalescing of concurrent identical fetches; SHARED also coalesces across workers via file locks
+    'SINGLE_FLIGHT_SHARED': os.environ.get('EATFIT_SINGLE_FLIGHT_SHARED', '0') == '1',
+    'SINGLE_FLIGHT_DIR': os.environ.get(
+        'EATFIT_SINGLE_FLIGHT_DIR',
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'single_flight')
+    ),
+    'SINGLE_FLIGHT_SHARED_TTL': 10,  # Seconds another worker's result may be reused
+
+    # Local mirror of the OFF data dump, read before the API for product lookups and searches
+    'MIRROR_ENABLED': os.environ.get('EATFIT_OFF_MIRROR', '1') == '1',
+    'MIRROR_PATH': os.environ.get(
+        'EATFIT_OFF_MIRROR_PATH',
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'instance', 'off_products.sqlite3')
+    ),
+    # Import filters: products are kept when they match any country and any category (empty = all)
+    'MIRROR_COUNTRIES': [c for c in os.environ.get('EATFIT_OFF_MIRROR_COUNTRIES', 'en:india').split(',') if c],
+    'MIRROR_CATEGORIES': [c for c in os.environ.get('EATFIT_OFF_MIRROR_CATEGORIES', '').split(',') if c],
+    'MIRROR_BATCH_SIZE': 1000,  # Products written per transaction during an import
+
+    # Daily delta exports applied to the mirror: a local directory of delta files or the OFF delta URL
+    'DELTA_SOURCE': os.environ.get('EATFIT_OFF_DELTA_SOURCE', 'https://static.openfoodfacts.org/data/delta'),
+    # Seconds between in-app delta syncs; 0 leaves syncing to the sync_off_deltas command.
+    # Each web worker runs the timer, but a lock file lets only one of them sync at a time.
+    'DELTA_SYNC_INTERVAL': int(os.environ.get('EATFIT_OFF_DELTA_SYNC_INTERVAL', 0)),
+}
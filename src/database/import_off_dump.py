@@ -0,0 +1,38 @@
+"""
+Import an Open Food Facts data dump into the local product mirror.
+
+Download the JSONL or CSV export from https://world.openfoodfacts.org/data
+and run from the src directory:
+    python -m database.import_off_dump openfoodfacts-products.jsonl.gz [--country en:india] [--category en:biscuits]
+
+Countries and categories default to OFF_CONFIG['MIRROR_COUNTRIES'] and
+OFF_CONFIG['MIRROR_CATEGORIES']; pass --all-countries to keep every country.
+"""
+import argparse
+import logging
+import time
+from config.openfoodfacts import OFF_CONFIG
+from utils.off_mirror import ProductStore, import_dump
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('dump', help='path to the JSONL or CSV dump (optionally .gz)')
+    parser.add_argument('--country', action='append', dest='countries',
+                        help='country tag to keep, may be repeated')
+    parser.add_argument('--all-countries', action='store_true', help='do not filter by country')
+    parser.add_argument('--category', action='append', dest='categories',
+                        help='category tag to keep, may be repeated')
+    parser.add_argument('--db', default=OFF_CONFIG['MIRROR_PATH'], help='mirror database path')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    countries = [] if args.all_countries else args.countries
+    start = time.monotonic()
+    store = ProductStore(args.db)
+    read, imported = import_dump(store, args.dump, countries=countries, categories=args.categories)
+    print(f"Imported {imported} of {read} products into {args.db} in {time.monotonic() - start:.1f}s "
+          f"({store.count()} products mirrored)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Apply Open Food Facts daily delta exports to the local product mirror.
+
+Run from the src directory, e.g. daily from cron:
+    python -m database.sync_off_deltas [--source DIR_OR_URL]
+
+Only delta files newer than the stored watermark are applied, so the
+command can be re-run at any time and resumes after an interruption. A run
+that starts while another process (a web worker or an earlier run) is
+syncing the same mirror exits without applying anything.
+"""
+import argparse
+import logging
+import time
+from config.openfoodfacts import OFF_CONFIG
+from utils.off_mirror import ProductStore
+from utils.off_sync import sync_deltas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--source', default=OFF_CONFIG['DELTA_SOURCE'],
+                        help='directory of delta files or the OFF delta base URL')
+    parser.add_argument('--db', default=OFF_CONFIG['MIRROR_PATH'], help='mirror database path')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    start = time.monotonic()
+    summary = sync_deltas(ProductStore(args.db), args.source)
+    if summary['skipped']:
+        print("Another process is syncing the mirror; nothing applied")
+        return
+    print(f"Applied {summary['files']} delta files, {summary['changed']} products changed, "
+          f"watermark {summary['watermark']} ({time.monotonic() - start:.1f}s)")
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,12 @@
 from dataclasses import dataclass
 from typing import List, Dict, Optional
 from enum import Enum
-import requests
+from config.openfoodfacts import OFF_CONFIG
+from utils.cache import get_cache
+from utils.http_client import http_get
+from utils.off_mirror import get_mirrored_product
+from utils.single_flight import get_single_flight
+from utils.gtin import normalize_gtin
 
 class ProcessingLevel(Enum):
     UNPROCESSED = 1
@@ -254,113 +259,184 @@ def process_ingredients_tags(tags):
         return []
     return [extract_code_from_tag(tag) for tag in tags]
 
-def get_product_from_off(barcode):
+# Process-wide cache of processed products, shared by every caller of get_product_from_off
+_product_cache = get_cache(
+    'off.product',
+    max_size=OFF_CONFIG['PRODUCT_CACHE_SIZE'],
+    ttl=OFF_CONFIG['PRODUCT_CACHE_TTL'],
+    max_stale=OFF_CONFIG['PRODUCT_CACHE_MAX_STALE']
+)
+# Concurrent lookups of the same barcode wait on one upstream fetch
+_product_flight = get_single_flight('flight.off.product')
+# Barcodes Open Food Facts answered "product not found" for
+_not_found_cache = get_cache(
+    'off.not_found',
+    max_size=OFF_CONFIG['NOT_FOUND_CACHE_SIZE'],
+    ttl=OFF_CONFIG['NOT_FOUND_CACHE_TTL']
+)
+
+def is_unknown_barcode(barcode):
+    """Check whether Open Food Facts recently confirmed it has no product for this barcode."""
+    return barcode in _not_found_cache
+
+def mark_unknown_barcode(barcode):
+    """Remember a confirmed "product not found" so repeat lookups skip the network."""
+    _not_found_cache.set(barcode, True)
+
+def process_off_product(product):
     """
-    Get product information from the Open Food Facts API.
-    This function processes and cleans up the data before returning it.
+    Clean up a raw Open Food Facts product in place.
+
+    The raw dict is updated rather than copied so that only one version of
+    each product is kept in memory.
     
     Args:
-        barcode (str): The product barcode to fetch
+        product (dict): The 'product' object from an Open Food Facts response
         
     Returns:
-        dict: Dictionary containing cleaned and processed product data or None if not found
+        dict: The same dictionary, with additives, tags and scores normalized
     """
-    try:
-        if not barcode or len(barcode) < 8:
-            return None
+    # Process additives comprehensively
+    if 'additives_tags' in product:
+        formatted_additives = []
+        for tag in product['additives_tags']:
+            # Extract the additive code from the tag
+            code = extract_code_from_tag(tag)
             
-        url = f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
-        response = requests.get(url)
-        
-        if response.status_code != 200:
-            return None
+            # Format properly for display
+            display_code = format_additive_code(code)
             
-        data = response.json()
-        
-        if data.get('status') != 1 or 'product' not in data:
-            return None
+            # Try to get the name from additives fields
+            name = None
+            for field in ['additives_original_tags', 'additives_old_tags']:
+                if not name and field in product:
+                    for original in product[field]:
+                        if code in original.lower():
+                            parts = original.split(':')
+                            if len(parts) > 1:
+                                name = parts[-1].replace('-', ' ').title()
+                                break
             
-        product = data['product']
-        
-        # Process additives comprehensively
-        if 'additives_tags' in product:
-            formatted_additives = []
-            for tag in product['additives_tags']:
-                # Extract the additive code from the tag
-                code = extract_code_from_tag(tag)
-                
-                # Format properly for display
-                display_code = format_additive_code(code)
-                
-                # Try to get the name from additives fields
-                name = None
-                for field in ['additives_original_tags', 'additives_old_tags']:
-                    if not name and field in product:
-                        for original in product[field]:
-                            if code in original.lower():
-                                parts = original.split(':')
-                                if len(parts) > 1:
-                                    name = parts[-1].replace('-', ' ').title()
-                                    break
-                
-                # If still no name, use the display code
-                if not name:
-                    name = display_code
-                
-                # Get description from our database if available
-                description = ADDITIVES_INFO.get(display_code, f"{display_code} - {name}")
-                formatted_additives.append(description)
-            
-            # Replace the original additives_tags with our better formatted version
-            product['additives_tags'] = formatted_additives
-        else:
-            product['additives_tags'] = []
+            # If still no name, use the display code
+            if not name:
+                name = display_code
             
-        # Clean up the ingredients analysis tags
-        if 'ingredients_analysis_tags' in product:
-            product['ingredients_analysis_tags'] = [tag.lower() for tag in product['ingredients_analysis_tags']]
-        else:
-            product['ingredients_analysis_tags'] = []
+            # Get description from our database if available
+            description = ADDITIVES_INFO.get(display_code, f"{display_code} - {name}")
+            formatted_additives.append(description)
         
-        # Process allergens and traces
-        if 'allergens_tags' in product:
-            product['allergens_tags'] = process_ingredients_tags(product['allergens_tags'])
-        else:
-            product['allergens_tags'] = []
-            
-        if 'traces_tags' in product:
-            product['traces_tags'] = process_ingredients_tags(product['traces_tags'])
-        else:
-            product['traces_tags'] = []
+        # Replace the original additives_tags with our better formatted version
+        product['additives_tags'] = formatted_additives
+    else:
+        product['additives_tags'] = []
         
-        # Process palm oil information
-        product['contains_palm_oil'] = False
-        if 'ingredients_from_palm_oil_n' in product:
-            try:
-                palm_oil_count = int(product['ingredients_from_palm_oil_n'])
-                product['contains_palm_oil'] = palm_oil_count > 0
-            except (ValueError, TypeError):
-                pass
+    # Clean up the ingredients analysis tags
+    if 'ingredients_analysis_tags' in product:
+        product['ingredients_analysis_tags'] = [tag.lower() for tag in product['ingredients_analysis_tags']]
+    else:
+        product['ingredients_analysis_tags'] = []
+    
+    # Process allergens and traces
+    if 'allergens_tags' in product:
+        product['allergens_tags'] = process_ingredients_tags(product['allergens_tags'])
+    else:
+        product['allergens_tags'] = []
         
-        # Determine vegan status
-        product['is_vegan'] = product.get('vegan') not in ('no', 'non-vegan')
+    if 'traces_tags' in product:
+        product['traces_tags'] = process_ingredients_tags(product['traces_tags'])
+    else:
+        product['traces_tags'] = []
+    
+    # Process palm oil information
+    product['contains_palm_oil'] = False
+    if 'ingredients_from_palm_oil_n' in product:
+        try:
+            palm_oil_count = int(product['ingredients_from_palm_oil_n'])
+            product['contains_palm_oil'] = palm_oil_count > 0
+        except (ValueError, TypeError):
+            pass
+    
+    # Determine vegan status
+    product['is_vegan'] = product.get('vegan') not in ('no', 'non-vegan')
+    
+    # Clean up nova group
+    nova_group = product.get('nova_group')
+    if nova_group is not None:
+        try:
+            product['nova_group'] = int(nova_group)
+        except (ValueError, TypeError):
+            product['nova_group'] = 4  # Default to ultra-processed if invalid
+    else:
+        product['nova_group'] = 4  # Default to ultra-processed if not specified
         
-        # Clean up nova group
-        nova_group = product.get('nova_group')
-        if nova_group is not None:
-            try:
-                product['nova_group'] = int(nova_group)
-            except (ValueError, TypeError):
-                product['nova_group'] = 4  # Default to ultra-processed if invalid
-        else:
-            product['nova_group'] = 4  # Default to ultra-processed if not specified
-            
+    return product
+
+def _fetch_product(barcode):
+    """Fetch and process a product from the Open Food Facts API."""
+    url = f"{OFF_CONFIG['BASE_URL']}/api/v0/product/{barcode}.json"
+    response = http_get(url)
+    
+    if response.status_code == 404:
+        mark_unknown_barcode(barcode)
+        return None
+    if response.status_code != 200:
+        return None
+        
+    data = response.json()
+    
+    if data.get('status') != 1 or 'product' not in data:
+        mark_unknown_barcode(barcode)
+        return None
+        
+    return process_off_product(data['product'])
+
+def _load_product(barcode):
+    """Load a processed product from the local mirror, or the API if it is not mirrored."""
+    product = get_mirrored_product(barcode)
+    if product is not None:
+        return process_off_product(product)
+    if is_unknown_barcode(barcode):
+        return None
+    return _product_flight.do(barcode, lambda: _fetch_product(barcode))
+
+def get_product_from_off(barcode):
+    """
+    Get product information from Open Food Facts.
+    This function processes and cleans up the data before returning it.
+
+    The local mirror of the OFF dump is read first; the API is only called
+    for products that are not mirrored. Processed products are kept in a
+    shared LRU/TTL cache, so repeated lookups of the same barcode (scan,
+    verify, details) only hit the API once per TTL window, and concurrent
+    lookups of the same barcode share a single fetch. Expired entries are
+    served stale while they are refreshed in the background, so only a
+    product's first lookup waits on the upstream fetch. The returned dict
+    is the cached instance and must not be mutated.
+    
+    Args:
+        barcode (str): The product barcode to fetch; invalid GTINs are
+            rejected without a lookup
+        
+    Returns:
+        dict: Dictionary containing cleaned and processed product data or None if not found
+    """
+    try:
+        barcode = normalize_gtin(barcode)
+        if barcode is None:
+            return None
+
+        product, _ = _product_cache.get_or_load(barcode, lambda: _load_product(barcode))
         return product
         
     except Exception as e:
         print(f"Error fetching product from OpenFoodFacts: {str(e)}")
         return None
 
+def invalidate_cached_product(barcode):
+    """Drop a product from the shared caches, e.g. after the local mirror updated it."""
+    _product_cache.invalidate(barcode)
+    _not_found_cache.invalidate(barcode)
+
 def analyze_product_with_off(barcode):
     """
     Analyze a product using the Open Food Facts database.
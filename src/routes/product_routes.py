@@ -1,16 +1,22 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g, jsonify
-from werkzeug.utils import secure_filename
 import os
 import io
 from utils.common import allowed_file
-from utils.image_processing import OCR_CONFIGS, extract_text
+from utils.image_processing import OCR_CONFIGS, extract_text, select_sharpest
 from utils.nutrition import (
-    parse_nutrition, process_with_config, calculate_nutri_score,
+    process_with_config, calculate_nutri_score,
     get_alternatives_by_category, merge_nutrition_data, get_nova_score
 )
 from utils.allergies import map_allergens_to_ingredients
 from utils.conclusion import check_product_safety
 from models.food_analysis import get_product_from_off, analyze_product_with_off, ProductAnalysis
+from utils.cache import cache_stats, track_freshness, pop_freshness, FRESH, STALE, MISS
+from config.ocr import OCR_SETTINGS
+from utils.ocr_jobs import get_job_queue, DONE, FAILED
+from utils.ocr_cache import get_ocr_cache
+from utils.barcode_detection import decode_barcode
+from utils.gtin import normalize_gtin
+from utils.upload_ingest import read_upload, decode_image, persist_upload, UploadTooLarge, InvalidImage
 import logging
 import json
 import requests
@@ -121,6 +127,12 @@ def analyze_food_api():
             'text_result': 'Product Analysis Results\n\nError occurred while analyzing the product.'
         }), 500
 
+@product_bp.route('/api/cache/stats')
+def cache_stats_api():
+    """Return hit/miss/eviction counters for every shared cache."""
+    get_ocr_cache()  # Make sure the OCR result cache is registered
+    return jsonify(cache_stats())
+
 # Routes
 @product_bp.route('/landing_page')
 def landing_page():
@@ -131,13 +143,28 @@ def upload_file():
     if request.method == "POST":
         # Get barcode if provided
         barcode = request.form.get('barcode', '').strip()
-        has_file = 'file' in request.files and request.files['file'].filename
+        files = [f for f in request.files.getlist('file') if f.filename]
+        has_file = bool(files)
+        
+        # Optional OCR quality tier; only the profiles this deployment allows per request
+        ocr_profile = request.form.get('ocr_profile') or None
+        if ocr_profile and ocr_profile not in OCR_SETTINGS['REQUEST_PROFILES']:
+            flash(f"OCR mode '{ocr_profile}' is not available, using the default", "warning")
+            ocr_profile = None
         
         # Check if neither file nor barcode is provided
         if not has_file and not barcode:
             flash("Please provide either an image or a barcode number", "error")
             return render_template("upload.html")
 
+        # Reject mistyped barcodes locally instead of looking them up
+        if barcode:
+            normalized = normalize_gtin(barcode)
+            if normalized is None:
+                flash("That barcode is not valid. Please check the digits and try again", "error")
+                return render_template("upload.html")
+            barcode = normalized
+
         # If barcode is provided but no file, fetch data directly from API
         if barcode and not has_file:
             try:
@@ -148,15 +175,7 @@ def upload_file():
                     flash("Product not found or no data available", "error")
                     return render_template("upload.html")
                 
-                # Store analysis in session
-                analysis_dict = analysis.to_dict()
-                session['nutrition'] = analysis_dict
-                session['product_name'] = analysis_dict.get('product_name', 'Unknown Product')
-                session['brand'] = analysis_dict.get('brand', 'Unknown Brand')
-                session['barcode'] = barcode
-                session['from_barcode_only'] = True
-                
-                flash(f"Found product: {session['product_name']} by {session['brand']}", "success")
+                _store_barcode_analysis(analysis, barcode)
                 return redirect(url_for('product.product_details'))
                 
             except Exception as e:
@@ -165,21 +184,44 @@ def upload_file():
         
         # Process file upload
         if has_file:
-            file = request.files["file"]
+            if len(files) > OCR_SETTINGS['MAX_UPLOAD_FRAMES']:
+                flash(f"Please upload at most {OCR_SETTINGS['MAX_UPLOAD_FRAMES']} photos", "error")
+                return render_template("upload.html")
             
-            if not allowed_file(file.filename):
+            if not all(allowed_file(f.filename) for f in files):
                 flash("File type not allowed. Please upload an image (JPG, PNG, etc.)", "error")
                 return render_template("upload.html")
 
             try:
-                # Save the uploaded file
-                filename = secure_filename(file.filename)
+                # Read and decode the upload in memory; nothing is written yet
+                frames = [read_upload(f) for f in files]
+                images = [decode_image(data) for data in frames]
+                
+                # Use the sharpest frame
+                best, quality = select_sharpest(images)
+                file, data, image = files[best], frames[best], images[best]
+                logger.info(f"Upload quality: {quality}")
+                
+                # A barcode visible in the photo identifies the product without OCR
+                if not barcode:
+                    detected = decode_barcode(image)
+                    if detected:
+                        logger.info(f"Decoded barcode {detected} from uploaded image")
+                        analysis = analyze_product_with_off(detected)
+                        if analysis:
+                            _store_barcode_analysis(analysis, detected)
+                            return redirect(url_for('product.product_details'))
+                        # Unknown to Open Food Facts; OCR the label but keep the code
+                        barcode = detected
+                
+                # OCR of a blurry or badly lit photo finds nothing; ask for a retake instead
+                if OCR_SETTINGS['QUALITY_GATE'] and not quality['usable']:
+                    flash(quality['message'], "warning")
+                    return render_template("upload.html")
+                
                 app_config = g.app.config
                 
-                # Make sure the upload folder exists
                 upload_folder = app_config['UPLOAD_FOLDER']
-                # Create the directory if it doesn't exist
-                os.makedirs(upload_folder, exist_ok=True)
                 
                 # Ensure the uploads folder is in the static directory
                 if 'static/uploads' not in upload_folder and 'static\\uploads' not in upload_folder:
@@ -188,13 +230,10 @@ def upload_file():
                         upload_folder = os.path.join('src', 'static', 'uploads')
                     else:
                         upload_folder = os.path.join('static', 'uploads')
-                    os.makedirs(upload_folder, exist_ok=True)
-                
-                upload_path = os.path.join(upload_folder, filename)
-                file.save(upload_path)
                 
-                # Log the saved path for debugging
-                print(f"Saved file to: {upload_path}")
+                # The verify page shows the photo, so keep a content-addressed copy
+                extension = file.filename.rsplit('.', 1)[1]
+                filename, upload_path = persist_upload(data, upload_folder, extension)
                 
                 # Store file information in session
                 session['file_path'] = upload_path
@@ -208,35 +247,125 @@ def upload_file():
                 else:
                     session.pop('barcode', None)
                 
-                # Process the image with OCR
-                nutrition_data = extract_text(upload_path)
-                if isinstance(nutrition_data, dict) and not nutrition_data.get('error'):
-                    # If we have a barcode, try to get additional data
-                    if barcode:
-                        analysis = analyze_product_with_off(barcode)
-                        if analysis:
-                            analysis_dict = analysis.to_dict()
-                            # Merge OCR data with API data
-                            nutrition_data.update(analysis_dict)
-                            session['product_name'] = analysis_dict.get('product_name')
-                            session['brand'] = analysis_dict.get('brand')
-                            flash(f"Found product: {analysis_dict.get('product_name')}", "success")
-                    
-                    session['nutrition'] = nutrition_data
-                    flash("Image processed successfully! Please verify the extracted information.", "success")
-                else:
-                    session['nutrition'] = {}
-                    error_msg = nutrition_data.get('error', 'Failed to extract nutrition information')
-                    flash(f"OCR processing issue: {error_msg}. Please enter the values manually.", "warning")
+                # Run OCR in the background on the decoded image; the verify page polls for the result
+                job_id = get_job_queue().submit(upload_path, barcode or None, image=image, profile=ocr_profile)
+                session['ocr_job_id'] = job_id
+                # Kept after the result is applied: the job also holds the alternative OCR results
+                session['ocr_candidates_job_id'] = job_id
+                session['nutrition'] = {}
+                flash("Image uploaded! Extracting nutrition information...", "info")
                     
                 return redirect(url_for('product.verify_extraction'))
                 
+            except UploadTooLarge as e:
+                flash(f"{str(e)}. Please upload a smaller image.", "error")
+                return render_template("upload.html")
+            except InvalidImage as e:
+                flash(f"{str(e)}. Please upload a JPG or PNG photo.", "error")
+                return render_template("upload.html")
             except Exception as e:
                 flash(f"Error processing upload: {str(e)}", "error")
                 return render_template("upload.html")
 
     return render_template("upload.html")
 
+@product_bp.context_processor
+def inject_ocr_profiles():
+    """Offer the OCR profiles this deployment allows per request on the upload form."""
+    return {'ocr_profiles': OCR_SETTINGS['REQUEST_PROFILES']}
+
+@product_bp.before_request
+def start_freshness_tracking():
+    track_freshness()
+
+@product_bp.after_request
+def report_freshness(response):
+    """
+    Report how fresh the cached product data behind a response was.
+
+    Sets X-Data-Freshness to the overall state ('fresh', 'stale' or 'miss'
+    when something had to be fetched) followed by the state of each cache
+    consulted, e.g. "stale; off.product=stale, alternatives.search=fresh".
+    """
+    entries = list(dict.fromkeys(pop_freshness()))
+    if entries:
+        states = {state for _, state in entries}
+        overall = FRESH if states == {FRESH} else (STALE if STALE in states else MISS)
+        response.headers['X-Data-Freshness'] = f"{overall}; " + ', '.join(f"{name}={state}" for name, state in entries)
+    return response
+
+@product_bp.app_errorhandler(413)
+def upload_too_large(e):
+    """Request bodies over MAX_CONTENT_LENGTH are rejected before they are read."""
+    flash("The uploaded image is too large. Please upload a smaller image.", "error")
+    return render_template("upload.html"), 413
+
+def _store_barcode_analysis(analysis, barcode):
+    """Store an Open Food Facts analysis found by barcode in the session."""
+    analysis_dict = analysis.to_dict()
+    session['nutrition'] = analysis_dict
+    session['product_name'] = analysis_dict.get('product_name', 'Unknown Product')
+    session['brand'] = analysis_dict.get('brand', 'Unknown Brand')
+    session['barcode'] = barcode
+    session['from_barcode_only'] = True
+    session.pop('ocr_candidates_job_id', None)
+    
+    flash(f"Found product: {session['product_name']} by {session['brand']}", "success")
+
+def _apply_ocr_result(nutrition_data, barcode=None):
+    """
+    Store the OCR result of an upload in the session, merged with
+    Open Food Facts data when a barcode was given.
+    """
+    if isinstance(nutrition_data, dict) and not nutrition_data.get('error'):
+        # If we have a barcode, try to get additional data
+        if barcode:
+            analysis = analyze_product_with_off(barcode)
+            if analysis:
+                analysis_dict = analysis.to_dict()
+                # Merge OCR data with API data
+                nutrition_data.update(analysis_dict)
+                session['product_name'] = analysis_dict.get('product_name')
+                session['brand'] = analysis_dict.get('brand')
+                flash(f"Found product: {analysis_dict.get('product_name')}", "success")
+        
+        session['nutrition'] = nutrition_data
+        flash("Image processed successfully! Please verify the extracted information.", "success")
+    else:
+        session['nutrition'] = {}
+        error_msg = (nutrition_data or {}).get('error', 'Failed to extract nutrition information')
+        flash(f"OCR processing issue: {error_msg}. Please enter the values manually.", "warning")
+
+def _ocr_candidates():
+    """
+    Alternative OCR results of the current upload, best first.
+    
+    Returns:
+        list: Nutrition value sets kept by the upload's OCR job; empty if the
+        job is unknown, still running or has expired
+    """
+    job_id = session.get('ocr_candidates_job_id')
+    if not job_id:
+        return []
+    job = get_job_queue().get(job_id)
+    if not job or job['status'] != DONE:
+        return []
+    return job.get('candidates') or []
+
+@product_bp.route("/ocr_status/<job_id>")
+def ocr_status(job_id):
+    """Report the state of a background OCR job as JSON."""
+    job = get_job_queue().get(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown OCR job'}), 404
+    
+    return jsonify({
+        'id': job['id'],
+        'status': job['status'],
+        'result': job['result'] if job['status'] == DONE else None,
+        'error': job['error']
+    })
+
 @product_bp.route("/verify", methods=["GET", "POST"])
 def verify_extraction():
     if 'file_path' not in session or 'filename' not in session:
@@ -298,8 +427,25 @@ def verify_extraction():
                 
             return redirect(url_for('product.product_details'))
         else:
-            # Try another OCR configuration
+            # Try another OCR configuration: the upload's OCR job already holds
+            # the results of every config it ran, so no OCR or API call is needed
             current_idx = session.get('current_config_idx', 0)
+            candidates = _ocr_candidates()
+            
+            if candidates:
+                new_idx = (current_idx + 1) % len(candidates)
+                session['current_config_idx'] = new_idx
+                nutrition_data = dict(candidates[new_idx])
+                
+                # Keep product details found for the barcode
+                for key in ('product_name', 'brand'):
+                    if key in session:
+                        nutrition_data[key] = session[key]
+                session['nutrition'] = nutrition_data
+                
+                flash(f"Showing OCR result {new_idx+1} of {len(candidates)}. Please verify the extracted values.", "info")
+                return redirect(url_for('product.verify_extraction'))
+            
             new_idx = (current_idx + 1) % len(OCR_CONFIGS)
             
             try:
@@ -330,6 +476,23 @@ def verify_extraction():
                 
             return redirect(url_for('product.verify_extraction'))
     
+    # Pick up the result of the background OCR job, if one is running
+    ocr_job_id = session.get('ocr_job_id')
+    ocr_pending = False
+    if ocr_job_id:
+        job = get_job_queue().get(ocr_job_id)
+        if not job:
+            session.pop('ocr_job_id', None)
+            flash("OCR results are no longer available. Please enter the values manually.", "warning")
+        elif job['status'] == DONE:
+            session.pop('ocr_job_id', None)
+            _apply_ocr_result(job['result'], session.get('barcode'))
+        elif job['status'] == FAILED:
+            session.pop('ocr_job_id', None)
+            _apply_ocr_result({'error': job['error']})
+        else:
+            ocr_pending = True
+    
     # Get session values with defaults
     nutrition = session.get('nutrition', {})
     config_number = session.get('current_config_idx', 0) + 1
@@ -378,7 +541,9 @@ def verify_extraction():
         image=filename,
         nutrition=nutrition,
         config_number=config_number,
-        product_info=product_info
+        product_info=product_info,
+        ocr_pending=ocr_pending,
+        ocr_job_id=ocr_job_id if ocr_pending else None
     )
 
 @product_bp.route("/product_details")
@@ -399,12 +564,12 @@ def product_details():
             barcode = session['barcode']
             logger.info(f"Getting latest data for barcode: {barcode}")
             
-            # Get fresh data directly from OpenFoodFacts
+            # Get product data (served from the shared product cache when available)
             try:
                 product = get_product_from_off(barcode)
                 
                 if product:
-                    logger.info(f"Got fresh data from API for barcode {barcode}")
+                    logger.info(f"Got product data for barcode {barcode}")
                     
                     # Update nutrition data with the latest API data
                     # Update basic product info
@@ -1,7 +1,11 @@
 import pandas as pd
 import os
 import logging
-import requests
+from config.openfoodfacts import OFF_CONFIG
+from utils.http_client import http_get
+from utils.off_mirror import get_mirrored_product
+from utils.gtin import normalize_gtin
+from models.food_analysis import is_unknown_barcode, mark_unknown_barcode
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -44,17 +48,34 @@ except Exception as e:
     logger.error(f"Error loading allergies data: {str(e)}")
     df_allergies = pd.DataFrame(DEFAULT_ALLERGIES_DATA)
 
+def _split_ingredients(ingredients_text):
+    return [ing.strip() for ing in ingredients_text.split(",") if ing.strip()]
+
 def fetch_ingredients_from_barcode(barcode):
-    """Fetch ingredients from Open Food Facts API"""
-    api_url = f"https://world.openfoodfacts.org/api/v2/product/{barcode}.json"
+    """Fetch ingredients from the local product mirror, or the Open Food Facts API"""
+    barcode = normalize_gtin(barcode)
+    if barcode is None:
+        return None
+
+    product = get_mirrored_product(barcode)
+    if product is not None:
+        return _split_ingredients(product.get("ingredients_text", ""))
+    if is_unknown_barcode(barcode):
+        return None
+
+    api_url = f"{OFF_CONFIG['BASE_URL']}/api/v2/product/{barcode}.json"
     try:
-        response = requests.get(api_url)
+        response = http_get(api_url)
+        if response.status_code == 404:
+            mark_unknown_barcode(barcode)
+            return None
+        if response.status_code != 200:
+            return None
         data = response.json()
         
         if data.get("status") == 1:  # Product found
-            ingredients_text = data["product"].get("ingredients_text", "")
-            ingredient_list = [ing.strip() for ing in ingredients_text.split(",") if ing.strip()]
-            return ingredient_list
+            return _split_ingredients(data["product"].get("ingredients_text", ""))
+        mark_unknown_barcode(barcode)
         return None
     except Exception as e:
         logger.error(f"Error fetching ingredients: {str(e)}")
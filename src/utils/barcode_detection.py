@@ -0,0 +1,83 @@
+"""
+Barcode detection for uploaded label photos.
+
+Decoding a visible EAN/UPC barcode takes milliseconds, so uploads try it
+first and only fall back to OCR when no valid product code is found.
+OpenCV's barcode detector is used when available, with pyzbar as an
+optional second decoder.
+"""
+import logging
+import threading
+import cv2
+from utils.gtin import normalize_gtin
+
+try:
+    from pyzbar import pyzbar
+except ImportError:
+    pyzbar = None
+
+logger = logging.getLogger(__name__)
+
+# Product code symbologies; anything else (QR codes, Code 128...) is ignored
+_PYZBAR_TYPES = {'EAN13', 'EAN8', 'UPCA', 'UPCE'}
+# EAN-8/UPC-E, UPC-A and EAN-13; GTIN-14 is only printed on cases, not consumer packs
+_PRODUCT_CODE_LENGTHS = (8, 12, 13)
+
+_local = threading.local()
+
+def _opencv_detector():
+    """Get this thread's OpenCV barcode detector, or None if this OpenCV build has none."""
+    detector = getattr(_local, 'detector', None)
+    if detector is None:
+        barcode_module = getattr(cv2, 'barcode', None)
+        if barcode_module is None:
+            return None
+        detector = _local.detector = barcode_module.BarcodeDetector()
+    return detector
+
+def _decode_opencv(image):
+    detector = _opencv_detector()
+    if detector is None:
+        return []
+
+    if hasattr(detector, 'detectAndDecodeWithType'):
+        ok, decoded, _, _ = detector.detectAndDecodeWithType(image)
+    else:
+        ok, decoded, _, _ = detector.detectAndDecode(image)
+    return [code for code in decoded if code] if ok else []
+
+def _decode_pyzbar(image):
+    if pyzbar is None:
+        return []
+    return [
+        symbol.data.decode('ascii', errors='ignore')
+        for symbol in pyzbar.decode(image)
+        if symbol.type in _PYZBAR_TYPES
+    ]
+
+def decode_barcode(image):
+    """
+    Decode the first valid EAN/UPC product code visible in an image.
+
+    UPC-E codes are expanded to UPC-A, and every code is returned in the
+    normalized form used for product lookups.
+
+    Args:
+        image: BGR image as a NumPy array
+
+    Returns:
+        str: The product code, or None if none was found
+    """
+    for decoder in (_decode_opencv, _decode_pyzbar):
+        try:
+            codes = decoder(image)
+        except cv2.error as e:
+            logger.warning(f"Barcode decoding failed: {str(e)}")
+            continue
+
+        for code in codes:
+            if len(code) in _PRODUCT_CODE_LENGTHS:
+                normalized = normalize_gtin(code)
+                if normalized:
+                    return normalized
+    return None
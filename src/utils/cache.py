@@ -0,0 +1,250 @@
+"""
+In-memory caching utilities shared across the application.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Freshness of a cache lookup
+FRESH = 'fresh'
+STALE = 'stale'
+MISS = 'miss'
+
+# Background revalidation of stale entries, shared by every cache
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-refresh')
+
+# Freshness of the lookups made by the current thread while a request is being tracked
+_freshness = threading.local()
+
+def track_freshness():
+    """Start recording the freshness of the current thread's get_or_load lookups."""
+    _freshness.entries = []
+
+def record_freshness(name, state):
+    """Remember that the current thread was served `state` data from cache `name`, if tracking."""
+    entries = getattr(_freshness, 'entries', None)
+    if entries is not None:
+        entries.append((name, state))
+
+def pop_freshness():
+    """
+    Stop tracking and return the freshness of the current thread's lookups.
+
+    Returns:
+        list: (cache name, state) tuples in lookup order
+    """
+    entries = getattr(_freshness, 'entries', None) or []
+    _freshness.entries = None
+    return entries
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live.
+
+    Entries expire `ttl` seconds after they were stored. When the cache is
+    full, the least recently used entry is evicted to make room.
+
+    With `max_stale` set, expired entries are kept that many seconds longer
+    and get_or_load serves them immediately while a background task
+    refreshes them (stale-while-revalidate). Past `max_stale` an entry is
+    hard-expired and the caller loads it again.
+    """
+
+    def __init__(self, name, max_size=256, ttl=3600, max_stale=0):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.RLock()
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def lookup(self, key):
+        """
+        Look up `key`, telling fresh entries from stale ones.
+
+        Returns:
+            tuple: (value, FRESH), (value, STALE) for an expired entry still
+            within max_stale, or (None, MISS)
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, MISS
+
+            expires_at, value = entry
+            now = time.monotonic()
+            if expires_at <= now:
+                if expires_at + self.max_stale <= now:
+                    del self._data[key]
+                    self.expirations += 1
+                    self.misses += 1
+                    return None, MISS
+                self._data.move_to_end(key)
+                self.stale_hits += 1
+                return value, STALE
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, FRESH
+
+    def get(self, key, default=None):
+        """Return the cached value for `key`, or `default` if missing or expired."""
+        value, state = self.lookup(key)
+        return value if state == FRESH else default
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Return the cached value for `key`, loading it on a miss.
+
+        A stale value is returned at once and refreshed in the background;
+        a missing or hard-expired value is loaded by the caller. A loader
+        result of None is not cached, and a failed refresh keeps serving
+        the stale value until it hard-expires.
+
+        Args:
+            key: Cache key
+            loader (callable): Fetches the current value
+            ttl (int): Optional TTL for the stored value
+
+        Returns:
+            tuple: (value, freshness), freshness being FRESH, STALE or MISS
+        """
+        value, state = self.lookup(key)
+        if state == STALE:
+            self._revalidate(key, loader, ttl)
+        elif state == MISS:
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl)
+
+        record_freshness(self.name, state)
+        return value, state
+
+    def _revalidate(self, key, loader, ttl):
+        """Refresh a stale entry in the background, once per key at a time."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = loader()
+            except Exception as e:
+                value = None
+                logger.warning(f"Background refresh of {self.name} entry failed: {str(e)}")
+            try:
+                with self._lock:
+                    if value is None:
+                        self.refresh_failures += 1
+                    else:
+                        self.refreshes += 1
+                        self.set(key, value, ttl)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        _refresh_executor.submit(refresh)
+
+    def set(self, key, value, ttl=None):
+        """Store `value` under `key`, evicting least recently used entries if needed."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+            self._data[key] = (time.monotonic() + ttl, value)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Remove `key` from the cache if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry (statistics are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'max_stale': self.max_stale,
+                'stale_hits': self.stale_hits,
+                'refreshes': self.refreshes,
+                'refresh_failures': self.refresh_failures,
+                'hit_rate': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            }
+
+# Process-wide registry so every module shares the same cache instances
+_caches = {}
+_registry_lock = threading.Lock()
+
+def get_cache(name, max_size=256, ttl=3600, max_stale=0):
+    """
+    Get the process-wide cache registered under `name`, creating it on first use.
+
+    Args:
+        name (str): Cache namespace, e.g. 'off.product'
+        max_size (int): Maximum number of entries kept in the cache
+        ttl (int): Time-to-live of each entry in seconds
+        max_stale (int): Seconds past the TTL an entry may still be served
+            by get_or_load while it is refreshed
+
+    Returns:
+        TTLCache: The shared cache instance
+    """
+    with _registry_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = TTLCache(name, max_size=max_size, ttl=ttl, max_stale=max_stale)
+            _caches[name] = cache
+        return cache
+
+def register_cache(cache):
+    """
+    Register another cache implementation (anything with `name` and `stats()`)
+    so its counters are reported by cache_stats.
+    """
+    with _registry_lock:
+        _caches[cache.name] = cache
+    return cache
+
+def cache_stats():
+    """Return statistics for every registered cache, keyed by cache name."""
+    with _registry_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
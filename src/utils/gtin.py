@@ -0,0 +1,99 @@
+"""
+GTIN (EAN/UPC) barcode validation utilities.
+
+Product barcodes are GTIN-8 (EAN-8), GTIN-12 (UPC-A), GTIN-13 (EAN-13) or
+GTIN-14 codes whose last digit is a mod-10 check digit. Validating it
+locally rejects mistyped or misread codes before any lookup, and
+normalizing leading zeros makes "012345678905" (UPC-A) and
+"0012345678905" (GTIN-14) resolve to the same 13-digit code used by Open
+Food Facts.
+
+UPC-E codes are 8 digits long like EAN-8, but their check digit belongs
+to the zero-suppressed UPC-A code they stand for, so they are expanded
+before validation.
+"""
+
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+def gtin_check_digit(digits):
+    """
+    Compute the check digit for a GTIN body (all digits except the check digit).
+
+    Args:
+        digits (str): The GTIN without its check digit
+
+    Returns:
+        int: The check digit
+    """
+    # Weights alternate 3, 1, ... starting from the digit left of the check digit
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return (10 - total % 10) % 10
+
+def is_valid_gtin(code, lengths=GTIN_LENGTHS):
+    """
+    Check that a code is a GTIN of an allowed length with a valid check digit.
+
+    Args:
+        code (str): Barcode digits
+        lengths (tuple): Allowed code lengths
+
+    Returns:
+        bool: True if the code is a well-formed GTIN
+    """
+    if not code or not code.isdigit() or len(code) not in lengths:
+        return False
+    return gtin_check_digit(code[:-1]) == int(code[-1])
+
+def expand_upce(code):
+    """
+    Expand a zero-suppressed UPC-E code to the UPC-A code it stands for.
+
+    Args:
+        code (str): 8-digit UPC-E code (number system 0 or 1, six digits, check digit)
+
+    Returns:
+        str: The 12-digit UPC-A code, or None if `code` cannot be UPC-E
+    """
+    if not code or not code.isdigit() or len(code) != 8 or code[0] not in '01':
+        return None
+
+    number_system, digits, check = code[0], code[1:7], code[7]
+    last = digits[5]
+    if last in '012':
+        body = digits[0:2] + last + '0000' + digits[2:5]
+    elif last == '3':
+        body = digits[0:3] + '00000' + digits[3:5]
+    elif last == '4':
+        body = digits[0:4] + '00000' + digits[4]
+    else:
+        body = digits[0:5] + '0000' + last
+    return number_system + body + check
+
+def normalize_gtin(code):
+    """
+    Clean up and validate a barcode entered or decoded for a product lookup.
+
+    Spaces and hyphens are removed; UPC-E codes are expanded to UPC-A, and
+    UPC-A and GTIN-14 codes with spare leading zeros are brought to 13
+    digits, the form Open Food Facts uses. EAN-8 codes are kept as they are.
+
+    Args:
+        code (str): Barcode as entered or decoded
+
+    Returns:
+        str: The normalized code, or None if it is not a valid GTIN
+    """
+    if code is None:
+        return None
+    code = str(code).strip().replace(' ', '').replace('-', '')
+    if len(code) == 8 and not is_valid_gtin(code):
+        # Not a valid EAN-8, but possibly a UPC-E code
+        code = expand_upce(code)
+    if not is_valid_gtin(code):
+        return None
+
+    if len(code) == 12:
+        code = '0' + code
+    elif len(code) == 14 and code.startswith('0'):
+        code = code[1:]
+    return code
@@ -0,0 +1,73 @@
+"""
+Shared HTTP client for outbound API calls (Open Food Facts and friends).
+
+A single pooled requests.Session is reused across the process so that
+connections are kept alive between calls instead of paying a new TCP+TLS
+handshake per request. Retries and timeouts are applied uniformly.
+"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config.openfoodfacts import OFF_CONFIG
+
+_session = None
+_session_lock = threading.Lock()
+
+def _build_session():
+    """Create a session with connection pooling and retry/backoff configured."""
+    retry = Retry(
+        total=OFF_CONFIG['MAX_RETRIES'],
+        connect=OFF_CONFIG['MAX_RETRIES'],
+        read=OFF_CONFIG['MAX_RETRIES'],
+        backoff_factor=OFF_CONFIG['BACKOFF_FACTOR'],
+        status_forcelist=OFF_CONFIG['RETRY_STATUSES'],
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False  # Hand the last response back instead of raising
+    )
+    adapter = HTTPAdapter(
+        pool_connections=OFF_CONFIG['POOL_CONNECTIONS'],
+        pool_maxsize=OFF_CONFIG['POOL_MAXSIZE'],
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'User-Agent': OFF_CONFIG['USER_AGENT']})
+    return session
+
+def get_session():
+    """
+    Get the process-wide pooled session, creating it on first use.
+
+    Returns:
+        requests.Session: Session with keep-alive, per-host pool limits and retries
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+def http_get(url, params=None, timeout=None, **kwargs):
+    """
+    Perform a GET request through the shared session.
+
+    Args:
+        url (str): URL to fetch
+        params (dict): Optional query parameters
+        timeout (tuple): Optional (connect, read) timeout in seconds;
+            defaults to the configured timeouts
+        **kwargs: Extra arguments passed on to requests (e.g. stream=True)
+
+    Returns:
+        requests.Response: The response, after any retries
+
+    Raises:
+        requests.exceptions.RequestException: If the request still fails after retries
+    """
+    if timeout is None:
+        timeout = (OFF_CONFIG['CONNECT_TIMEOUT'], OFF_CONFIG['READ_TIMEOUT'])
+    return get_session().get(url, params=params, timeout=timeout, **kwargs)
@@ -3,10 +3,25 @@ Image processing utilities for OCR.
 """
 import os
 import cv2
-import pytesseract
 import re
 import numpy as np
+import random
 import time
+import logging
+import multiprocessing
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from config.ocr import OCR_SETTINGS
+from utils.ocr_cache import get_ocr_cache, image_dhash
+from utils.ocr_backends import get_ocr_backend
+from utils.table_detection import normalize_label_geometry
+from utils.table_reader import read_nutrition
+from utils.nutrition_parser import parse_label, NUTRIENTS, KJ_PER_KCAL, SALT_PER_SODIUM
+
+logger = logging.getLogger(__name__)
 
 # OCR Configuration
 OCR_CONFIGS = [
@@ -14,189 +29,823 @@ OCR_CONFIGS = [
     {
         'oem': 1,  # Legacy engine (sometimes more accurate for tabular data)
         'psm': 4,  # Assume single column of text with variable sizes
-        'extra': '--tessdata-dir "C:\\Program Files\\Tesseract-OCR\\tessdata" -l eng --dpi 300'
+        'lang': 'eng',
+        'tessdata_dir': OCR_SETTINGS['TESSDATA_DIR'],
+        'dpi': 300
     },
     
     # Config 2: LSTM neural network with single column assumption
     {
         'oem': 3,  # LSTM neural net only
         'psm': 6,  # Assume a single uniform block of text
-        'extra': '-c tessedit_char_whitelist="0123456789.,ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz() " --tessdata-dir "C:\\Program Files\\Tesseract-OCR\\tessdata" -l eng'
+        'whitelist': '0123456789.,ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz() ',
+        'lang': 'eng',
+        'tessdata_dir': OCR_SETTINGS['TESSDATA_DIR']
     },
     
     # Config 3: Optimized for numerical values and measurements
     {
         'oem': 3,
         'psm': 11,  # Sparse text with OSD
-        'extra': '-c tessedit_char_whitelist="0123456789.,g% " --tessdata-dir "C:\\Program Files\\Tesseract-OCR\\tessdata" -l eng'
+        'whitelist': '0123456789.,g% ',
+        'lang': 'eng',
+        'tessdata_dir': OCR_SETTINGS['TESSDATA_DIR']
     },
     
     # Config 4: High accuracy mode for structured text
     {
         'oem': 1,
         'psm': 3,  # Fully automatic page segmentation
-        'extra': '--tessdata-dir "C:\\Program Files\\Tesseract-OCR\\tessdata" -l eng'
+        'lang': 'eng',
+        'tessdata_dir': OCR_SETTINGS['TESSDATA_DIR']
     }
 ]
 
-def enhance_image(image):
+# Nutrients every label declares: adaptive OCR stops once they are read confidently, and a result
+# must contain them before its barcode alone may answer later uploads from the cache
+CORE_NUTRIENTS = ['energy_kcal', 'fat', 'carbohydrates', 'sugars', 'protein']
+
+# Names of the preprocessed variants, in the order enhance_image returns them
+PREPROCESS_VARIANTS = [
+    'gray',
+    'bilateral',
+    'clahe',
+    'adaptive_threshold',
+    'otsu_threshold',
+    'adaptive_open',
+    'adaptive_close',
+    'otsu_open',
+    'otsu_close',
+    'edges'
+]
+
+def estimate_text_height(gray):
     """
-    Enhanced image processing specifically for Indian nutrition labels
+    Estimate the typical character height of an image from its connected components.
+    
+    Args:
+        gray: Grayscale image as a NumPy array
+        
+    Returns:
+        float: Median character height in pixels, or None if too few
+        character-like components were found
     """
-    # Make a copy to avoid modifying the original
-    img = image.copy()
+    # Measure on a small copy; component heights are scaled back afterwards
+    height, width = gray.shape[:2]
+    factor = min(1.0, 1000 / max(height, width))
+    if factor < 1.0:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
     
-    # Resize if image is too small
-    height, width = img.shape[:2]
-    if width < 800 or height < 600:
-        scale_factor = max(800 / width, 600 / height)
-        img = cv2.resize(img, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_CUBIC)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Text may be light on dark; characters are the minority colour
+    if cv2.countNonZero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
     
-    # Try multiple preprocessing techniques to increase OCR accuracy
-    processed_images = []
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
     
-    # 1. Basic grayscale conversion
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    processed_images.append(gray)
+    # Keep components shaped like characters: not specks, rules or whole blocks
+    is_char = (heights >= 4) & (heights <= binary.shape[0] // 5) & (widths <= heights * 3) & (areas >= 8)
+    if np.count_nonzero(is_char) < 20:
+        return None
+    return float(np.median(heights[is_char])) / factor
+
+def normalize_resolution(image):
+    """
+    Resize an image so its text is about OCR_SETTINGS['TARGET_TEXT_HEIGHT'] pixels tall.
     
-    # 2. Bilateral filter to preserve edges while removing noise
-    blurred = cv2.bilateralFilter(gray, 9, 75, 75)
-    processed_images.append(blurred)
+    The longer side is kept within OCR_SETTINGS['MIN_SIDE'] and
+    OCR_SETTINGS['MAX_SIDE']. When no text height can be estimated the image
+    is only brought within those bounds.
     
-    # 3. Apply CLAHE for better contrast
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    enhanced = clahe.apply(blurred)
-    processed_images.append(enhanced)
+    Args:
+        image: BGR image as a NumPy array
+        
+    Returns:
+        The resized image (or the original if it is already close to target)
+    """
+    longest = max(image.shape[:2])
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
     
-    # 4. Apply adaptive thresholding
-    binary_adaptive = cv2.adaptiveThreshold(
-        enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-    processed_images.append(binary_adaptive)
+    text_height = estimate_text_height(gray)
+    scale = OCR_SETTINGS['TARGET_TEXT_HEIGHT'] / text_height if text_height else 1.0
+    scale = min(max(scale, OCR_SETTINGS['MIN_SIDE'] / longest), OCR_SETTINGS['MAX_SIDE'] / longest)
     
-    # 5. Apply Otsu thresholding
-    _, binary_otsu = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    processed_images.append(binary_otsu)
+    # Resampling by a few percent costs time and gains nothing
+    if abs(scale - 1.0) < 0.1:
+        return image
     
-    # 6. Apply morphological operations to both thresholded images
-    for binary in [binary_adaptive, binary_otsu]:
-        # Noise removal (opening)
-        kernel = np.ones((2, 2), np.uint8)
-        opening = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=1)
-        processed_images.append(opening)
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+    logger.info(f"Normalizing resolution by {scale:.2f} (text height {text_height or 'unknown'})")
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+
+# Advice shown to the user for each reason an upload is rejected
+RETAKE_MESSAGES = {
+    'blurry': "The photo is blurry. Hold the camera steady, tap to focus on the nutrition table and retake it.",
+    'dark': "The photo is too dark. Move to better light or turn on the flash and retake it.",
+    'overexposed': "The photo is overexposed or has glare on the label. Avoid direct light on the packaging and retake it.",
+    'low_contrast': "The label text is too faint to read. Retake the photo closer to the nutrition table in even light."
+}
+
+def assess_image_quality(image):
+    """
+    Measure whether an image is sharp, well exposed and contrasted enough to OCR.
+    
+    Metrics are computed on a copy at most 1000 px on its longer side, so
+    they are comparable between photos of different resolutions.
+    
+    Args:
+        image: BGR image as a NumPy array
+        
+    Returns:
+        dict: 'sharpness' (variance of the Laplacian), 'brightness' (mean
+        grey level), 'clipped' (fraction of blown-out pixels), 'contrast'
+        (spread between the 1st and 99th grey-level percentiles), 'usable',
+        and 'problem'/'message' naming the first failed check (None when
+        usable)
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    factor = min(1.0, 1000 / max(gray.shape[:2]))
+    if factor < 1.0:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    brightness = float(gray.mean())
+    clipped = float(np.count_nonzero(gray >= OCR_SETTINGS['CLIP_LEVEL'])) / gray.size
+    # Text covers only a few percent of a label, so the 5th/95th percentiles would both land on the
+    # background; the 1st/99th still reach the ink
+    low, high = np.percentile(gray, (1, 99))
+    contrast = float(high - low)
+    
+    problem = None
+    if brightness < OCR_SETTINGS['MIN_BRIGHTNESS']:
+        problem = 'dark'
+    elif clipped > OCR_SETTINGS['MAX_CLIPPED']:
+        problem = 'overexposed'
+    elif contrast < OCR_SETTINGS['MIN_CONTRAST']:
+        problem = 'low_contrast'
+    elif sharpness < OCR_SETTINGS['MIN_SHARPNESS']:
+        problem = 'blurry'
+    
+    return {
+        'sharpness': round(sharpness, 1),
+        'brightness': round(brightness, 1),
+        'clipped': round(clipped, 3),
+        'contrast': round(contrast, 1),
+        'usable': problem is None,
+        'problem': problem,
+        'message': RETAKE_MESSAGES.get(problem)
+    }
+
+def select_sharpest(images):
+    """
+    Pick the sharpest of several frames of the same label.
+    
+    Args:
+        images (list): BGR images as NumPy arrays
+        
+    Returns:
+        tuple: (index of the chosen frame, its quality report from assess_image_quality)
+    """
+    reports = [assess_image_quality(image) for image in images]
+    # Prefer usable frames, then the sharpest
+    best = max(range(len(images)), key=lambda i: (reports[i]['usable'], reports[i]['sharpness']))
+    return best, reports[best]
+
+class PreprocessedImages:
+    """
+    Lazily built preprocessing variants of one label image.
+
+    Behaves like the list enhance_image used to return (indexable, iterable,
+    sized, in PREPROCESS_VARIANTS order), but each variant is only computed
+    when an OCR pass asks for it. Shared intermediates such as the grayscale,
+    bilateral-filtered and CLAHE images are computed once and reused.
+
+    Before any variant is built the image is resized to the OCR working
+    resolution (see normalize_resolution); pass normalize=False to only
+    upscale images smaller than 800x600, as before.
+    """
+
+    _MORPH_KERNEL = np.ones((2, 2), np.uint8)
+
+    def __init__(self, image, debug=False, normalize=True):
+        self._source = image  # Never modified, so no defensive copy is needed
+        self._results = {}
+        self._debug = debug
+        self._normalize = normalize
+        self._timestamp = int(time.time())
+        self._builders = {
+            'resized': self._build_resized,
+            'gray': self._build_gray,
+            'bilateral': self._build_bilateral,
+            'clahe': self._build_clahe,
+            'adaptive_threshold': self._build_adaptive_threshold,
+            'otsu_threshold': self._build_otsu_threshold,
+            'adaptive_open': lambda: self._open('adaptive_threshold'),
+            'adaptive_close': lambda: self._close('adaptive_open'),
+            'otsu_open': lambda: self._open('otsu_threshold'),
+            'otsu_close': lambda: self._close('otsu_open'),
+            'edges': self._build_edges
+        }
+
+    def get(self, name):
+        """Return the named variant (or intermediate), computing it on first use."""
+        result = self._results.get(name)
+        if result is None:
+            result = self._builders[name]()
+            self._results[name] = result
+            if self._debug and name in PREPROCESS_VARIANTS:
+                self._save_debug_image(name, result)
+        return result
+
+    @property
+    def debug(self):
+        """Whether this upload was sampled for debug output."""
+        return self._debug
+
+    def __getitem__(self, index):
+        return self.get(PREPROCESS_VARIANTS[index])
+
+    def __len__(self):
+        return len(PREPROCESS_VARIANTS)
+
+    def __iter__(self):
+        for name in PREPROCESS_VARIANTS:
+            yield self.get(name)
+
+    def _build_resized(self):
+        if self._normalize:
+            return normalize_resolution(self._source)
         
+        # Resize if image is too small
+        img = self._source
+        height, width = img.shape[:2]
+        if width < 800 or height < 600:
+            scale_factor = max(800 / width, 600 / height)
+            img = cv2.resize(img, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_CUBIC)
+        return img
+
+    def _build_gray(self):
+        # Basic grayscale conversion
+        return cv2.cvtColor(self.get('resized'), cv2.COLOR_BGR2GRAY)
+
+    def _build_bilateral(self):
+        # Bilateral filter to preserve edges while removing noise
+        return cv2.bilateralFilter(self.get('gray'), 9, 75, 75)
+
+    def _build_clahe(self):
+        # CLAHE for better contrast
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        return clahe.apply(self.get('bilateral'))
+
+    def _build_adaptive_threshold(self):
+        return cv2.adaptiveThreshold(
+            self.get('clahe'), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+
+    def _build_otsu_threshold(self):
+        _, binary_otsu = cv2.threshold(self.get('clahe'), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return binary_otsu
+
+    def _open(self, source):
+        # Noise removal (opening)
+        return cv2.morphologyEx(self.get(source), cv2.MORPH_OPEN, self._MORPH_KERNEL, iterations=1)
+
+    def _close(self, source):
         # Connect text (closing)
-        kernel = np.ones((2, 2), np.uint8)
-        closing = cv2.morphologyEx(opening, cv2.MORPH_CLOSE, kernel, iterations=1)
-        processed_images.append(closing)
-    
-    # 7. Apply edge enhancement
-    edges = cv2.Canny(enhanced, 50, 150)
-    dilated_edges = cv2.dilate(edges, np.ones((2,2), np.uint8), iterations=1)
-    edge_enhanced = cv2.bitwise_not(dilated_edges)
-    processed_images.append(edge_enhanced)
-    
-    # Save debug images
-    debug_dir = os.path.join('debug_images')
-    if not os.path.exists(debug_dir):
-        os.makedirs(debug_dir)
-    
-    timestamp = int(time.time())
-    for i, img in enumerate(processed_images):
-        cv2.imwrite(f"{debug_dir}/process_{i}_{timestamp}.jpg", img)
-    
-    return processed_images
-
-def find_nutrition_values(text):
-    """
-    Extract nutrition values from OCR text using regex patterns tailored for nutrition labels,
-    with special attention to Indian nutrition label formats
-    """
-    # Extended patterns for better matching of Indian nutrition labels
-    patterns = {
-        'energy_kcal': r'(?:energy|calories|kcal|energy value)[^\d]*(\d+[\.,]?\d*)\s*(?:kcal|kj)?',
-        'fat': r'(?:total\s*fat|fat\s*content|fat)[^\d]*(\d+[\.,]?\d*)\s*g',
-        'saturated_fat': r'(?:saturated\s*fat|saturates|sat\.\s*fat)[^\d]*(\d+[\.,]?\d*)\s*g',
-        'carbohydrates': r'(?:total\s*carbohydrate|carbohydrate|carbohydrates|carb|carbs)[^\d]*(\d+[\.,]?\d*)\s*g',
-        'sugars': r'(?:of\s*which\s*sugars|sugars?|total\s*sugars)[^\d]*(\d+[\.,]?\d*)\s*g',
-        'fiber': r'(?:dietary\s*fibre|dietary\s*fiber|fibre|fiber)[^\d]*(\d+[\.,]?\d*)\s*g',
-        'protein': r'(?:protein|proteins)[^\d]*(\d+[\.,]?\d*)\s*g',
-        'salt': r'(?:salt|sodium)[^\d]*(\d+[\.,]?\d*)\s*(?:g|mg)'
+        return cv2.morphologyEx(self.get(source), cv2.MORPH_CLOSE, self._MORPH_KERNEL, iterations=1)
+
+    def _build_edges(self):
+        # Edge enhancement
+        edges = cv2.Canny(self.get('clahe'), 50, 150)
+        dilated_edges = cv2.dilate(edges, self._MORPH_KERNEL, iterations=1)
+        return cv2.bitwise_not(dilated_edges)
+
+    def _save_debug_image(self, name, img):
+        debug_dir = os.path.join('debug_images')
+        os.makedirs(debug_dir, exist_ok=True)
+        index = PREPROCESS_VARIANTS.index(name)
+        cv2.imwrite(f"{debug_dir}/process_{index}_{name}_{self._timestamp}.jpg", img)
+
+def enhance_image(image):
+    """
+    Enhanced image processing specifically for Indian nutrition labels.
+    
+    Returns a lazy sequence of preprocessing variants; nothing is computed
+    until an OCR pass requests a variant. Debug images are written for a
+    sampled fraction of uploads (OCR_SETTINGS['DEBUG_SAMPLE_RATE']).
+    """
+    debug = random.random() < OCR_SETTINGS['DEBUG_SAMPLE_RATE']
+    return PreprocessedImages(image, debug=debug)
+
+# Tesseract options used by the adaptive passes
+TESSERACT_OPTIONS = OCR_CONFIGS[1]
+
+# Named trade-offs between latency and accuracy. Each profile picks the
+# preprocessing variants and tesseract configs to try, how to run them and
+# the default wall-clock budget in seconds. Cached results are only reused
+# for a request whose profile has the same or a lower strength.
+OCR_PROFILES = {
+    # One binarized variant, the fast traineddata and a label-friendly whitelist
+    'fast': {
+        'mode': 'adaptive',
+        'variants': ['otsu_threshold'],
+        'configs': [dict(
+            TESSERACT_OPTIONS,
+            whitelist='0123456789.,%ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz ',
+            tessdata_dir=OCR_SETTINGS['FAST_TESSDATA_DIR'] or OCR_SETTINGS['TESSDATA_DIR']
+        )],
+        'time_budget': 5,
+        'strength': 0
+    },
+    # The variants that most often succeed, stopping early once confident
+    'balanced': {
+        'mode': 'adaptive',
+        'variants': ['otsu_threshold', 'adaptive_threshold', 'clahe', 'gray'],
+        'configs': [TESSERACT_OPTIONS],
+        'time_budget': 12,
+        'strength': 1
+    },
+    # Every variant with every config
+    'accurate': {
+        'mode': 'exhaustive',
+        'variants': PREPROCESS_VARIANTS,
+        'configs': OCR_CONFIGS,
+        'time_budget': 45,
+        'strength': 2
     }
+}
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def _get_ocr_pool():
+    """
+    Get the process pool used for OCR passes, creating it on first use.
     
-    results = {}
-    text = text.lower()
+    The pool is created from a request or job thread while other threads
+    may hold locks (logging, SQLite, the caches), so its workers are started
+    by a forkserver (or spawned where that is unavailable) rather than
+    forked from this multi-threaded process, which could copy a held lock
+    into a worker and deadlock it.
+    """
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _ocr_pool = ProcessPoolExecutor(max_workers=OCR_SETTINGS['POOL_SIZE'],
+                                            mp_context=multiprocessing.get_context(method))
+        return _ocr_pool
+
+def _reset_ocr_pool():
+    """Drop a broken process pool so the next upload starts a fresh one."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is not None:
+            _ocr_pool.shutdown(wait=False, cancel_futures=True)
+            _ocr_pool = None
+
+def _submit_ocr_pass(args):
+    """Submit one OCR pass to the pool, replacing the pool if it has crashed."""
+    try:
+        return _get_ocr_pool().submit(_ocr_pass, *args)
+    except BrokenProcessPool:
+        _reset_ocr_pool()
+        return _get_ocr_pool().submit(_ocr_pass, *args)
+
+def _read_words(words):
+    """
+    Read nutrition values from the words of one OCR pass.
     
-    # Print the text for debugging
-    print("OCR Text for analysis:")
-    print(text)
+    The layout-aware table reader pairs labels with the values on the same
+    row and column; the flat text parser fills in anything it missed.
     
-    for nutrient, pattern in patterns.items():
-        match = re.search(pattern, text)
-        if match:
-            try:
-                # Handle potential comma as decimal separator
-                value_text = match.group(1).replace(',', '.')
-                value = float(value_text)
-                
-                # Special case for salt/sodium conversion
-                if nutrient == 'salt' and 'mg' in match.group(0):
-                    value = value / 1000  # Convert mg to g
-                
-                results[nutrient] = value
-                print(f"Found {nutrient}: {value}")
-            except (ValueError, IndexError) as e:
-                print(f"Error parsing {nutrient}: {e}")
-                continue
-    
-    return results
-
-def enhanced_ocr(processed_images):
+    Returns:
+        tuple: (OCR text, extracted nutrition values)
     """
-    Perform OCR with multiple configurations and images for best results.
+    text = ' '.join(word.text for word in words)
+    values = read_nutrition(words)
+    if not all(key in values for key in NUTRIENTS):
+        for key, value in parse_label(text).items():
+            values.setdefault(key, value)
+    return text, values
+
+def _ocr_pass(img, image_idx, cfg_idx, options):
     """
+    Run a single tesseract pass over one preprocessed image.
+    This runs inside an OCR worker process, which keeps its OCR backend
+    (and any in-process engine) between passes.
+    
+    Returns:
+        tuple: (image index, config index, cleaned OCR text, extracted nutrition values)
+    """
+    words = get_ocr_backend().image_to_words(img, options)
+    text, values = _read_words(words)
+    return image_idx, cfg_idx, text, values
+
+def _merge_values(pass_results):
+    """Merge per-pass nutrition values in image/config order, as the serial grid did."""
     all_results = {}
+    for _, _, _, values in sorted(pass_results, key=lambda r: (r[0], r[1])):
+        for key, value in values.items():
+            if key not in all_results or (key in all_results and value > 0):
+                all_results[key] = value
+    return all_results
+
+def _rank_candidates(candidates):
+    """Drop empty and duplicate candidate value sets and order the rest by how many nutrients they found."""
+    unique = []
+    for values in candidates:
+        if values and values not in unique:
+            unique.append(values)
+    return sorted(unique, key=len, reverse=True)
+
+def _merge_ocr_results(pass_results, candidates=None, debug=False):
+    """
+    Merge per-pass nutrition values in image/config order, as the serial grid did.
+    
+    Args:
+        pass_results (list): (image index, config index, text, values) per pass
+        candidates (list): If given, the merged values of each config are
+            appended to it as alternative results
+        debug (bool): Append the text of every pass to debug_images/ocr_debug.log
+            (set for uploads sampled by DEBUG_SAMPLE_RATE)
+    """
+    if debug:
+        debug_dir = os.path.join('debug_images')
+        os.makedirs(debug_dir, exist_ok=True)
+        with open(os.path.join(debug_dir, 'ocr_debug.log'), 'a') as debug_log:
+            for i, cfg_idx, text, values in sorted(pass_results, key=lambda r: (r[0], r[1])):
+                debug_log.write(f"Config {cfg_idx+1}, Image {i+1}:\n{text}\n\nExtracted: {values}\n\n")
+    
+    if candidates is not None:
+        for cfg_idx in sorted({r[1] for r in pass_results}):
+            candidates.append(_merge_values([r for r in pass_results if r[1] == cfg_idx]))
+    
+    return _merge_values(pass_results)
+
+def enhanced_ocr(processed_images, time_budget=None, variants=None, configs=None, candidates=None):
+    """
+    Perform OCR with multiple configurations and images for best results.
     
-    for i, img in enumerate(processed_images):
-        for cfg_idx, cfg in enumerate(OCR_CONFIGS):
+    The image x config grid runs on a pool of OCR worker processes, at most
+    POOL_SIZE passes at a time: a running pass cannot be cancelled, so when
+    the wall-clock budget expires only the passes already running are left
+    to finish, and the values found by the completed passes are returned.
+    
+    Args:
+        processed_images: Preprocessed images from enhance_image
+        time_budget (float): Seconds allowed for the whole grid; defaults to OCR_SETTINGS['TIME_BUDGET']
+        variants (list): Names of the variants to OCR; defaults to all of PREPROCESS_VARIANTS
+        configs (list): Tesseract options to run on each variant; defaults to OCR_CONFIGS
+        candidates (list): If given, each config's own merged values are
+            appended to it as alternative results
+        
+    Returns:
+        dict: Merged nutrition values
+    """
+    if time_budget is None:
+        time_budget = OCR_SETTINGS['TIME_BUDGET']
+    if variants is None:
+        variants = PREPROCESS_VARIANTS[:len(processed_images)]
+    if configs is None:
+        configs = OCR_CONFIGS
+    debug = getattr(processed_images, 'debug', False)
+    
+    grid = [
+        (processed_images[i], i, cfg_idx, options)
+        for i in (PREPROCESS_VARIANTS.index(name) for name in variants)
+        for cfg_idx, options in enumerate(configs)
+    ]
+    pass_results = []
+    
+    # Run inline when parallelism is disabled
+    if OCR_SETTINGS['POOL_SIZE'] <= 1:
+        deadline = time.monotonic() + time_budget
+        for img, i, cfg_idx, options in grid:
+            if time.monotonic() >= deadline:
+                logger.warning("OCR time budget expired, returning best-so-far values")
+                break
             try:
-                config_str = '--oem 3 --psm 6 -c tessedit_char_whitelist="0123456789.,ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz() " --tessdata-dir "D:\\PyProject\\Eatfit\\Tesseract\\tessdata" -l eng'
-                text = pytesseract.image_to_string(img, config=config_str)
-                
-                # Clean OCR text
-                text = re.sub(r'\s+', ' ', text).strip()
-                
-                # Extract nutrition values
-                values = find_nutrition_values(text)
-                
-                # Merge with existing results
-                for key, value in values.items():
-                    if key not in all_results or (key in all_results and value > 0):
-                        all_results[key] = value
-                        
-                # Debug log
-                with open("ocr_debug.log", "a") as f:
-                    f.write(f"Config {cfg_idx+1}, Image {i+1}:\n{text}\n\nExtracted: {values}\n\n")
-                    
+                pass_results.append(_ocr_pass(img, i, cfg_idx, options))
             except Exception as e:
-                print(f"OCR Error (Config {cfg_idx+1}, Image {i+1}): {str(e)}")
+                logger.error(f"OCR Error (Config {cfg_idx+1}, Image {i+1}): {str(e)}")
+        return _merge_ocr_results(pass_results, candidates, debug)
     
-    return all_results
+    deadline = time.monotonic() + time_budget
+    remaining = list(reversed(grid))
+    futures = {}
+    while remaining or futures:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        
+        # Only submit what the pool can start now, so nothing is left queued when the budget expires
+        while remaining and len(futures) < OCR_SETTINGS['POOL_SIZE']:
+            args = remaining.pop()
+            futures[_submit_ocr_pass(args)] = args[1:3]
+        
+        done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            i, cfg_idx = futures.pop(future)
+            try:
+                pass_results.append(future.result())
+            except BrokenProcessPool:
+                _reset_ocr_pool()
+                logger.error(f"OCR worker pool crashed (Config {cfg_idx+1}, Image {i+1})")
+            except Exception as e:
+                logger.error(f"OCR Error (Config {cfg_idx+1}, Image {i+1}): {str(e)}")
+    
+    if remaining or futures:
+        logger.warning(f"OCR time budget expired with {len(remaining) + len(futures)} of {len(grid)} passes "
+                       "unfinished, returning best-so-far values")
+        for future in futures:
+            future.cancel()
+    
+    return _merge_ocr_results(pass_results, candidates, debug)
+
+class OCRVariantStats:
+    """
+    Persistent per-variant OCR success statistics.
+
+    Used by adaptive_ocr to try the preprocessing variants that historically
+    produced the most confident nutrient values first. Counters are kept in
+    SQLite and each save adds this process's new passes to them in place,
+    so every worker's passes are counted instead of the last writer's.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}  # variant -> [attempts, successes] not yet saved
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr_variant_stats (
+                    variant TEXT PRIMARY KEY,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    successes REAL NOT NULL DEFAULT 0
+                )
+            """)
+        self._stats = self._load()
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection, committing on success and always closing it."""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _load(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT variant, attempts, successes FROM ocr_variant_stats").fetchall()
+        return {variant: {'attempts': attempts, 'successes': successes} for variant, attempts, successes in rows}
+
+    def ranked(self, variants):
+        """Return `variants` ordered by historical success rate, best first."""
+        def success_rate(name):
+            entry = self._stats.get(name, {})
+            pending = self._pending.get(name, (0, 0))
+            # Laplace smoothing so untried variants are neither favoured nor buried
+            return (entry.get('successes', 0) + pending[1] + 1) / (entry.get('attempts', 0) + pending[0] + 2)
+
+        with self._lock:
+            return sorted(variants, key=success_rate, reverse=True)
+
+    def record(self, variant, nutrients_found):
+        """Record one OCR pass over `variant` that confidently read `nutrients_found` values."""
+        with self._lock:
+            entry = self._pending.setdefault(variant, [0, 0])
+            entry[0] += 1
+            entry[1] += nutrients_found / len(NUTRIENTS)
+
+    def save(self):
+        """Add the passes recorded since the last save to the stored counters."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            with self._connect() as conn:
+                conn.executemany("""
+                    INSERT INTO ocr_variant_stats (variant, attempts, successes) VALUES (?, ?, ?)
+                    ON CONFLICT (variant) DO UPDATE SET
+                        attempts = attempts + excluded.attempts,
+                        successes = successes + excluded.successes
+                """, [(variant, attempts, successes) for variant, (attempts, successes) in pending.items()])
+            stats = self._load()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not save OCR variant statistics: {str(e)}")
+            with self._lock:
+                # Keep the counts for the next save
+                for variant, (attempts, successes) in pending.items():
+                    entry = self._pending.setdefault(variant, [0, 0])
+                    entry[0] += attempts
+                    entry[1] += successes
+            return
+        with self._lock:
+            # Picks up the passes other workers saved in the meantime
+            self._stats = stats
+
+_variant_stats = None
+_variant_stats_lock = threading.Lock()
+
+def get_variant_stats():
+    """Get the process-wide OCR variant statistics, loading them on first use."""
+    global _variant_stats
+    with _variant_stats_lock:
+        if _variant_stats is None:
+            _variant_stats = OCRVariantStats(OCR_SETTINGS['STATS_PATH'])
+        return _variant_stats
+
+def _value_confidence(value, words):
+    """
+    Find the tesseract confidence of the word that holds `value`.
+    
+    Args:
+        value (float): Extracted nutrient value
+        words (list): WordBox tuples from the OCR backend
+        
+    Returns:
+        float: Confidence of the best matching word, or 0 if none matches
+    """
+    best = 0.0
+    for word in words:
+        for number in re.findall(r'\d+[\.,]?\d*', word.text):
+            number = float(number.replace(',', '.'))
+            # The parser may have converted mg, kJ or sodium values
+            candidates = (number, number / 1000, number / KJ_PER_KCAL, number * SALT_PER_SODIUM / 1000)
+            if any(abs(candidate - value) < 0.05 for candidate in candidates):
+                best = max(best, word.conf)
+    return best
+
+def _ocr_pass_with_confidence(img, options=None):
+    """
+    Run a tesseract pass that also reports per-nutrient confidences.
+    
+    Args:
+        img: Preprocessed image
+        options (dict): Tesseract options; defaults to TESSERACT_OPTIONS
+    
+    Returns:
+        tuple: (extracted nutrition values, {nutrient: confidence})
+    """
+    words = get_ocr_backend().image_to_words(img, options or TESSERACT_OPTIONS)
+    _, values = _read_words(words)
+    confidences = {key: _value_confidence(value, words) for key, value in values.items()}
+    return values, confidences
+
+def adaptive_ocr(processed_images, time_budget=None, variants=None, configs=None, candidates=None):
+    """
+    Perform OCR pass by pass, stopping once the core nutrients are read confidently.
+    
+    Variants are tried in order of their historical success rate and each
+    value is scored with tesseract's word confidences. For each nutrient the
+    most confident value seen is kept. Many labels omit fibre, sodium or
+    saturated fat, so only CORE_NUTRIENTS are required to stop early; the
+    others are kept when a pass reads them.
+    
+    Args:
+        processed_images: Preprocessed images from enhance_image
+        time_budget (float): Seconds allowed for all passes; defaults to OCR_SETTINGS['TIME_BUDGET']
+        variants (list): Names of the variants to try; defaults to all of PREPROCESS_VARIANTS
+        configs (list): Tesseract options to try on each variant; defaults to [TESSERACT_OPTIONS]
+        candidates (list): If given, the values of each pass are appended to
+            it as alternative results
+        
+    Returns:
+        dict: Nutrition values
+    """
+    if time_budget is None:
+        time_budget = OCR_SETTINGS['TIME_BUDGET']
+    if variants is None:
+        variants = PREPROCESS_VARIANTS[:len(processed_images)]
+    if configs is None:
+        configs = [TESSERACT_OPTIONS]
+    deadline = time.monotonic() + time_budget
+    min_confidence = OCR_SETTINGS['MIN_CONFIDENCE']
+    
+    stats = get_variant_stats()
+    plan = [
+        (PREPROCESS_VARIANTS.index(name), name, options)
+        for name in stats.ranked(list(variants))
+        for options in configs
+    ]
+    
+    best_values = {}
+    best_confidences = {}
+    passes = 0
+    
+    for i, name, options in plan:
+        if time.monotonic() >= deadline:
+            logger.warning("OCR time budget expired, returning best-so-far values")
+            break
+        
+        try:
+            values, confidences = _ocr_pass_with_confidence(processed_images[i], options)
+        except Exception as e:
+            logger.error(f"OCR Error (Image {i+1}): {str(e)}")
+            continue
+        passes += 1
+        if candidates is not None:
+            candidates.append(values)
+        
+        for key, value in values.items():
+            if confidences[key] > best_confidences.get(key, -1):
+                best_values[key] = value
+                best_confidences[key] = confidences[key]
+        
+        stats.record(name, sum(1 for conf in confidences.values() if conf >= min_confidence))
+        
+        if all(best_confidences.get(key, 0) >= min_confidence for key in CORE_NUTRIENTS):
+            break
+    
+    stats.save()
+    logger.info(f"Adaptive OCR finished after {passes} passes")
+    return best_values
 
-def extract_text(image_path):
+def extract_text(image, barcode=None, profile=None):
     """
     Extract text from an image and process it to find nutrition information.
+    
+    See extract_text_candidates for the arguments.
+    
+    Returns:
+        dict: The extracted nutrition values
     """
-    try:
-        img = cv2.imread(image_path)
+    return extract_text_candidates(image, barcode, profile)[0]
+
+def extract_text_candidates(image, barcode=None, profile=None):
+    """
+    Extract nutrition information from an image, keeping alternative results.
+    
+    The nutrition table is cropped and straightened once, before any
+    preprocessing variant is built. Results are cached on disk by a
+    perceptual hash of that table region (and barcode, if given), so
+    re-uploads of a known label skip OCR entirely; a cached result only
+    answers when it was produced by the requested profile or a stronger one.
+    
+    Args:
+        image: Path of the image file, or an already decoded BGR image
+        barcode (str): Optional barcode of the product
+        profile (str): Name of the OCR profile in OCR_PROFILES; defaults to
+            OCR_SETTINGS['PROFILE']. Asking for 'accurate' explicitly always
+            re-runs OCR instead of answering from the cache.
+    
+    Returns:
+        tuple: (merged nutrition values, ranked list of alternative value
+        sets from individual configs or passes, best first)
+    
+    Raises:
+        FileNotFoundError: If the image file cannot be read. OCR errors are
+            passed on as well, so a background job records them as failed.
+    """
+    if isinstance(image, str):
+        img = cv2.imread(image)
         if img is None:
-            raise FileNotFoundError(f"Image not found at {image_path}")
-            
-        processed_images = enhance_image(img)
-        nutrition_data = enhanced_ocr(processed_images)
-        
-        print(f"Extracted nutrition data: {nutrition_data}")
-        return nutrition_data
+            raise FileNotFoundError(f"Image not found at {image}")
+    else:
+        img = image
+    
+    # Only an explicit request for 'accurate' bypasses the cache, not the deployment default
+    refresh = profile == 'accurate'
+    profile = profile or OCR_SETTINGS['PROFILE']
+    settings = OCR_PROFILES[profile]
+    
+    if OCR_SETTINGS['TABLE_DETECTION']:
+        img = normalize_label_geometry(img)
+    
+    # The cache is keyed by the table region, not the whole frame around it
+    ocr_cache = get_ocr_cache()
+    if ocr_cache is not None:
+        phash = image_dhash(img)
+        cached = ocr_cache.lookup(phash, barcode, settings['strength']) if not refresh else None
+        if cached is not None:
+            logger.info("Using cached OCR result for uploaded image")
+            return cached
         
-    except Exception as e:
-        print(f"Extract Text Error: {str(e)}")
-        return {} 
\ No newline at end of file
+    processed_images = enhance_image(img)
+    run_ocr = adaptive_ocr if settings['mode'] == 'adaptive' else enhanced_ocr
+    candidates = []
+    nutrition_data = run_ocr(
+        processed_images,
+        time_budget=OCR_SETTINGS['PROFILE_BUDGETS'].get(profile, settings['time_budget']),
+        variants=settings['variants'],
+        configs=settings['configs'],
+        candidates=candidates
+    )
+    logger.info(f"OCR profile '{profile}' finished")
+    candidates = _rank_candidates([nutrition_data] + candidates)
+    
+    if ocr_cache is not None and nutrition_data:
+        ocr_cache.store(phash, nutrition_data, barcode, profile, settings['strength'],
+                        complete=all(key in nutrition_data for key in CORE_NUTRIENTS),
+                        candidates=candidates)
+    
+    logger.debug(f"Extracted nutrition data: {nutrition_data}")
+    return nutrition_data, candidates
+ 
\ No newline at end of file
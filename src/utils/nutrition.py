@@ -4,17 +4,196 @@ Nutrition data parsing and scoring utilities.
 import re
 import requests
 import json
+import sqlite3
 from utils.image_processing import extract_text
 import logging
 from models.food_analysis import get_product_from_off
+from config.openfoodfacts import OFF_CONFIG
+from utils.cache import get_cache, track_freshness, record_freshness, pop_freshness
+from utils.http_client import http_get
+from utils.off_mirror import get_product_store
+from utils.single_flight import get_single_flight
+from utils.gtin import normalize_gtin
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from functools import lru_cache
 from flask import url_for
 
 logger = logging.getLogger(__name__)
 
-# Simple cache for API responses to avoid repeated calls
-_product_cache = {}
+# Category searches are cached here; products come from the shared cache behind get_product_from_off
+_search_cache = get_cache(
+    'alternatives.search',
+    max_size=OFF_CONFIG['SEARCH_CACHE_SIZE'],
+    ttl=OFF_CONFIG['SEARCH_CACHE_TTL'],
+    max_stale=OFF_CONFIG['SEARCH_CACHE_MAX_STALE']
+)
+
+# Concurrent identical upstream requests are coalesced into one
+_search_flight = get_single_flight('flight.alternatives.search')
+
+# Maximum number of alternatives returned for a product
+MAX_ALTERNATIVES = 6
+
+# Bounded pool shared by all requests for concurrent category searches
+_search_executor = ThreadPoolExecutor(
+    max_workers=OFF_CONFIG['SEARCH_MAX_WORKERS'],
+    thread_name_prefix='off-search'
+)
+
+def _fetch_search(search_url, params, category):
+    """Run one category search against the Open Food Facts API."""
+    try:
+        search_response = http_get(search_url, params=params)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error searching category {category}: {str(e)}")
+        return None
+    
+    if search_response.status_code != 200:
+        logger.error(f"Error searching category {category}: HTTP {search_response.status_code}")
+        return None
+    
+    return search_response.json()
+
+def _search_category(category, target_grades):
+    """
+    Search Open Food Facts for products in a category with the target Nutri-Score grades.
+
+    The local product mirror is searched first; the API is only queried
+    when the mirror has no matching products.
+    
+    Returns:
+        dict: The search response (possibly from cache, possibly stale while
+        it is refreshed) or None if the search failed
+    """
+    store = get_product_store()
+    if store is not None:
+        try:
+            products = store.search_category(category, target_grades)
+        except sqlite3.Error as e:
+            logger.warning(f"Product mirror search failed for category {category}: {str(e)}")
+            products = []
+        if products:
+            return {'products': products}
+
+    search_url = f"{OFF_CONFIG['BASE_URL']}/cgi/search.pl"
+    
+    # Create cache key for this search
+    cache_key = f"{search_url}_{category}_{','.join(target_grades)}"
+    
+    params = {
+        'action': 'process',
+        'tagtype_0': 'categories',
+        'tag_contains_0': 'contains',
+        'tag_0': category,
+        'tagtype_1': 'nutrition_grades',
+        'tag_contains_1': 'contains',
+        'tag_1': target_grades,
+        'sort_by': 'unique_scans_n',
+        'page_size': 10,
+        'json': 1
+    }
+    
+    # Stale results are served while they refresh; concurrent searches for the same category share one request
+    search_data, _ = _search_cache.get_or_load(
+        cache_key, lambda: _search_flight.do(cache_key, lambda: _fetch_search(search_url, params, category))
+    )
+    return search_data
+
+def _search_category_tracked(category, target_grades):
+    """Run _search_category on a pool thread, returning the cache freshness it saw with the result."""
+    track_freshness()
+    try:
+        search_data = _search_category(category, target_grades)
+    finally:
+        freshness = pop_freshness()
+    return search_data, freshness
+
+def _get_product_tracked(barcode):
+    """Run get_product_from_off on a pool thread, returning the cache freshness it saw with the product."""
+    track_freshness()
+    try:
+        product = get_product_from_off(barcode)
+    finally:
+        freshness = pop_freshness()
+    return product, freshness
+
+def _compare_alternative(alt_product, barcode, current_product, current_grade, target_grades):
+    """
+    Compare a search result with the current product.
+    
+    Returns:
+        dict: Alternative product entry with the reasons it is healthier,
+              or None if it is not a usable improvement
+    """
+    # Skip if it's the same product or missing key data
+    if (alt_product.get('code') == barcode or
+        not alt_product.get('product_name') or
+        not alt_product.get('image_url') or
+        not alt_product.get('nutriments')):
+        return None
+    
+    # Calculate improvements over current product
+    improvements = []
+    
+    # Compare Nutri-Score
+    alt_score = alt_product.get('nutrition_grades', '').lower()
+    if alt_score in target_grades and (not current_grade or alt_score < current_grade.lower()):
+        improvements.append(f"Better Nutri-Score ({alt_score.upper()})")
+    
+    # Compare NOVA score
+    alt_nova = alt_product.get('nova_group')
+    current_nova = current_product['nova_group']
+    if alt_nova and current_nova and alt_nova < current_nova:
+        improvements.append("Less processed")
+    
+    # Compare key nutrients
+    alt_nutrients = alt_product.get('nutriments', {})
+    current_nutrients = current_product['nutrients']
+    
+    nutrient_comparisons = [
+        ('sugars_100g', 'sugar', '<'),
+        ('salt_100g', 'salt', '<'),
+        ('fiber_100g', 'fiber', '>'),
+        ('proteins_100g', 'protein', '>')
+    ]
+    
+    for nutrient_key, nutrient_name, comparison in nutrient_comparisons:
+        alt_value = alt_nutrients.get(nutrient_key, 0)
+        current_value = current_nutrients.get(nutrient_key, 0)
+        
+        if current_value > 0:  # Only compare if current product has this nutrient
+            if comparison == '<' and alt_value < current_value:
+                improvements.append(f"Lower in {nutrient_name}")
+            elif comparison == '>' and alt_value > current_value:
+                improvements.append(f"Higher in {nutrient_name}")
+    
+    # Only use product if we found improvements
+    if not improvements:
+        return None
+    
+    return {
+        'product_name': alt_product['product_name'],
+        'brand': alt_product.get('brands', 'Unknown Brand'),
+        'image_url': alt_product['image_url'],
+        'nutriscore_grade': alt_score.upper(),
+        'nova_group': alt_nova,
+        'reason': " • ".join(improvements[:3]),  # Top 3 improvements
+        'is_indian': False
+    }
+
+def invalidate_cached_alternatives(barcodes):
+    """
+    Drop cached category searches after the local mirror changed.
+
+    Products themselves are invalidated in get_product_from_off's cache.
+
+    Args:
+        barcodes (list): Barcodes whose product data changed
+    """
+    # Grades and categories may have changed, so any search result could be out of date
+    if barcodes:
+        _search_cache.clear()
 
 def get_alternatives_by_category(barcode, current_grade):
     """
@@ -73,43 +252,30 @@ def get_alternatives_by_category(barcode, current_grade):
                     }
             ]
 
-        # First, get the product details to find its category
-        url = f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
+        # Impossible barcodes are rejected without any request
+        barcode = normalize_gtin(barcode)
+        if barcode is None:
+            logger.warning("Invalid barcode, skipping alternatives lookup")
+            return []
+
+        # Overall time budget for the whole lookup
+        deadline = time.monotonic() + OFF_CONFIG['ALTERNATIVES_DEADLINE']
         
-        # Check cache first
-        if url in _product_cache:
-            data = _product_cache[url]
-        else:
-            # Use shorter timeout and retry logic
-            max_retries = 2
-            retry_delay = 1
-            timeout = 5
-            
-            for attempt in range(max_retries + 1):
-                try:
-                    response = requests.get(url, timeout=timeout)
-                    if response.status_code == 200:
-                        data = response.json()
-                        # Cache the result
-                        _product_cache[url] = data
-                        break
-                except requests.exceptions.RequestException as e:
-                    logger.warning(f"Request failed (attempt {attempt+1}/{max_retries+1}): {str(e)}")
-                    if attempt < max_retries:
-                        time.sleep(retry_delay)
-                        continue
-                    # Return fallback generic alternatives
-                    logger.warning(f"All API attempts failed for barcode {barcode}, using generic alternatives")
-                    return []
-            else:
-                logger.warning(f"Failed to get product details after {max_retries+1} attempts")
-                return []
+        # First, get the product to find its category, through the same mirror, cache and single
+        # upstream fetch as the product pages. The lookup counts against the deadline; if it runs
+        # out, the fetch still fills the cache.
+        future = _search_executor.submit(_get_product_tracked, barcode)
+        try:
+            product, freshness = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logger.warning(f"Alternatives deadline reached while fetching product {barcode}")
+            return []
         
-        if data.get('status') != 1 or 'product' not in data:
-            logger.warning(f"Invalid product data received for barcode {barcode}")
+        for name, state in freshness:
+            record_freshness(name, state)
+        if product is None:
+            logger.info(f"Product {barcode} not found, skipping alternatives lookup")
             return []
-            
-        product = data['product']
         
         # Get categories to search
         categories = []
@@ -132,202 +298,62 @@ def get_alternatives_by_category(barcode, current_grade):
             'nutriscore_grade': product.get('nutrition_grades', current_grade)
         }
         
-        alternatives = []
         target_grades = ['a', 'b']  # Look for A and B rated products
         
-        for category in categories:
-            try:
-                # Search for alternatives
-                search_url = "https://world.openfoodfacts.org/cgi/search.pl"
+        # Search all categories concurrently, then merge in category priority order
+        futures = [
+            _search_executor.submit(_search_category_tracked, category, target_grades)
+            for category in categories
+        ]
+        alternatives = []
+        
+        try:
+            for category, future in zip(categories, futures):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"Alternatives deadline reached before category {category} completed")
+                    break
                 
-                # Create cache key for this search
-                cache_key = f"{search_url}_{category}_{','.join(target_grades)}"
+                try:
+                    search_data, freshness = future.result(timeout=remaining)
+                except FutureTimeoutError:
+                    logger.warning(f"Alternatives deadline reached while searching category {category}")
+                    break
+                except Exception as e:
+                    logger.error(f"Error searching category {category}: {str(e)}")
+                    continue
                 
-                if cache_key in _product_cache:
-                    search_data = _product_cache[cache_key]
-                else:
-                    params = {
-                        'action': 'process',
-                        'tagtype_0': 'categories',
-                        'tag_contains_0': 'contains',
-                        'tag_0': category,
-                        'tagtype_1': 'nutrition_grades',
-                        'tag_contains_1': 'contains',
-                        'tag_1': target_grades,
-                        'sort_by': 'unique_scans_n',
-                        'page_size': 10,
-                        'json': 1
-                    }
-                    
-                    # Use shorter timeout and retry logic
-                    max_retries = 3
-                    retry_delay = 2
-                    timeout = 10  # Slightly longer timeout for search
-                    
-                    for attempt in range(max_retries + 1):
-                        try:
-                            search_response = requests.get(search_url, params=params, timeout=timeout)
-                            if search_response.status_code == 200:
-                                search_data = search_response.json()
-                                # Cache the result
-                                _product_cache[cache_key] = search_data
-                                break
-                        except requests.exceptions.RequestException as e:
-                            logger.warning(f"Category search failed (attempt {attempt+1}/{max_retries+1}): {str(e)}")
-                            if attempt < max_retries:
-                                time.sleep(retry_delay)
-                                continue
-                            logger.error(f"Error searching category {category}: Request failed after {max_retries+1} attempts")
-                            break  # Move to next category after all retries
-                    else:
-                        continue  # Skip to next category if all retries failed
+                for name, state in freshness:
+                    record_freshness(name, state)
+                if not search_data:
+                    continue
                 
                 for alt_product in search_data.get('products', []):
-                    # Skip if it's the same product or missing key data
-                    if (alt_product.get('code') == barcode or
-                        not alt_product.get('product_name') or
-                        not alt_product.get('image_url') or
-                        not alt_product.get('nutriments')):
-                        continue
-                    
-                    # Calculate improvements over current product
-                    improvements = []
-                    
-                    # Compare Nutri-Score
-                    alt_score = alt_product.get('nutrition_grades', '').lower()
-                    if alt_score in target_grades and (not current_grade or alt_score < current_grade.lower()):
-                        improvements.append(f"Better Nutri-Score ({alt_score.upper()})")
-                    
-                    # Compare NOVA score
-                    alt_nova = alt_product.get('nova_group')
-                    current_nova = current_product['nova_group']
-                    if alt_nova and current_nova and alt_nova < current_nova:
-                        improvements.append("Less processed")
-                    
-                    # Compare key nutrients
-                    alt_nutrients = alt_product.get('nutriments', {})
-                    current_nutrients = current_product['nutrients']
+                    alternative = _compare_alternative(
+                        alt_product, barcode, current_product, current_grade, target_grades
+                    )
                     
-                    nutrient_comparisons = [
-                        ('sugars_100g', 'sugar', '<'),
-                        ('salt_100g', 'salt', '<'),
-                        ('fiber_100g', 'fiber', '>'),
-                        ('proteins_100g', 'protein', '>')
-                    ]
+                    # Add to alternatives if not already present
+                    if alternative and not any(a['product_name'] == alternative['product_name'] for a in alternatives):
+                        alternatives.append(alternative)
                     
-                    for nutrient_key, nutrient_name, comparison in nutrient_comparisons:
-                        alt_value = alt_nutrients.get(nutrient_key, 0)
-                        current_value = current_nutrients.get(nutrient_key, 0)
-                        
-                        if current_value > 0:  # Only compare if current product has this nutrient
-                            if comparison == '<' and alt_value < current_value:
-                                improvements.append(f"Lower in {nutrient_name}")
-                            elif comparison == '>' and alt_value > current_value:
-                                improvements.append(f"Higher in {nutrient_name}")
-                    
-                    # Only add product if we found improvements
-                    if improvements:
-                        alternative = {
-                            'product_name': alt_product['product_name'],
-                            'brand': alt_product.get('brands', 'Unknown Brand'),
-                            'image_url': alt_product['image_url'],
-                            'nutriscore_grade': alt_score.upper(),
-                            'nova_group': alt_nova,
-                            'reason': " • ".join(improvements[:3]),  # Top 3 improvements
-                            'is_indian': False
-                        }
-                        
-                        # Add to alternatives if not already present
-                        if not any(a['product_name'] == alternative['product_name'] for a in alternatives):
-                            alternatives.append(alternative)
-                    
-                    # Limit to top 6 alternatives
-                    if len(alternatives) >= 6:
+                    # Limit to top alternatives
+                    if len(alternatives) >= MAX_ALTERNATIVES:
                         break
                 
-                if len(alternatives) >= 6:
+                if len(alternatives) >= MAX_ALTERNATIVES:
                     break
-                    
-            except Exception as e:
-                logger.error(f"Error searching category {category}: {str(e)}")
-                continue
+        finally:
+            # Drop searches that have not started yet; running ones still fill the cache
+            for future in futures:
+                future.cancel()
         
-        # Clean the cache if it gets too large
-        if len(_product_cache) > 100:
-            _product_cache.clear()
-            
-        return alternatives[:6]  # Return top 6 alternatives
+        return alternatives[:MAX_ALTERNATIVES]
             
     except Exception as e:
         logger.error(f"Error finding alternatives: {str(e)}")
         return []
 
-def parse_nutrition(text):
-    """
-    Parse nutrition information from text.
-    """
-    # Energy patterns with parentheses support
-    energy_matches = re.findall(
-        r'(?:Energy\s*\(?kcal\)?.*?)(\d+\.?\d*)|'
-        r'(\d+\.?\d*)\s*\(?kcal\)?(?=\s|$)',
-        text,
-        re.IGNORECASE
-    )
-    
-    energy_values = [float(m[0] or m[1]) for m in energy_matches if any(m)]
-    
-    nutrition = {
-        'energy_kcal': energy_values[0] if energy_values else None,
-        'sugars': None,
-        'salt': None
-    }
-
-    sugar_patterns = [
-        r'(of\s*which\s*sugars.*?)(\d+\.?\d*)\s*g',
-        r'\bsugars?\b.*?(\d+\.?\d*)\s*g'
-    ]
-    for pattern in sugar_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            try:
-                nutrition['sugars'] = float(match.group(1))
-                break
-            except:
-                continue
-
-    sodium_match = re.search(r'sodium.*?(\d+\.?\d*)\s*mg', text, re.IGNORECASE)
-    if sodium_match:
-        try:
-            sodium_mg = float(sodium_match.group(1))
-            nutrition['salt'] = sodium_mg / 400  # Convert to grams
-        except:
-            pass
-    
-    salt_match = re.search(r'salt.*?(\d+\.?\d*)\s*g', text, re.IGNORECASE)
-    if salt_match and not nutrition['salt']:
-        try:
-            nutrition['salt'] = float(salt_match.group(1))
-        except:
-            pass
-
-    nutrient_patterns = {
-        'fat': r'(Total Fat|Fat)[^\d]*(\d+\.?\d*)',
-        'saturated_fat': r'(Saturates|Saturated Fat)[^\d]*(\d+\.?\d*)',
-        'carbohydrates': r'(Carbohydrates|Carbs)[^\d]*(\d+\.?\d*)',
-        'fiber': r'(Fibre|Fiber)[^\d]*(\d+\.?\d*)',
-        'protein': r'Protein[^\d]*(\d+\.?\d*)'
-    }
-    
-    for nutrient, pattern in nutrient_patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            try:
-                nutrition[nutrient] = float(match.group(2))
-            except:
-                continue
-    
-    return nutrition
-
 def merge_nutrition_data(ocr_data, api_data):
     """
     Merge nutrition data from OCR and API, preferring API data when available.
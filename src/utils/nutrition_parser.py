@@ -0,0 +1,204 @@
+"""
+Single-pass nutrition label parser.
+
+A label is parsed with one tokenizing scan that yields words and numbers
+with their units; label words are matched against a lookup table and each
+number is assigned to the nutrient named most recently before it. Unlike
+per-nutrient regexes, which take the first number after a label anywhere
+in the text, this keeps a kJ value from being read as kcal, a "Trans Fat"
+or "Sodium" amount from being read as fat or salt, and converts units.
+"""
+import re
+
+# Label spellings per nutrient. Labels mapped to None are recognised only so
+# that their values are not attributed to a neighbouring nutrient.
+NUTRIENT_LABELS = {
+    'energy_kcal': ['energy value', 'energy', 'calories', 'calorie'],
+    'fat': ['total fat', 'fat content', 'fat'],
+    'saturated_fat': ['saturated fatty acids', 'saturated fat', 'saturates', 'sat. fat', 'sat fat'],
+    'carbohydrates': ['total carbohydrates', 'total carbohydrate', 'carbohydrates', 'carbohydrate', 'carbs', 'carb'],
+    'sugars': ['of which sugars', 'total sugars', 'added sugars', 'sugars', 'sugar'],
+    'fiber': ['dietary fibre', 'dietary fiber', 'fibre', 'fiber'],
+    'protein': ['proteins', 'protein'],
+    'salt': ['salt'],
+    'sodium': ['sodium'],
+    None: [
+        'trans fat', 'trans fatty acids', 'monounsaturated fat', 'polyunsaturated fat',
+        'mufa', 'pufa', 'cholesterol', 'calcium', 'iron', 'potassium'
+    ]
+}
+
+# Nutrients reported by the parser
+NUTRIENTS = [
+    'energy_kcal', 'fat', 'saturated_fat', 'carbohydrates',
+    'sugars', 'fiber', 'protein', 'salt'
+]
+
+def _label_key(label):
+    return tuple(label.replace('.', '').split())
+
+# First label word -> [(label words, nutrient key)], longest label first so
+# that 'saturated fat' wins over 'saturated'
+_LABEL_CANDIDATES = {}
+for _nutrient, _labels in NUTRIENT_LABELS.items():
+    for _label in _labels:
+        _key = _label_key(_label)
+        _LABEL_CANDIDATES.setdefault(_key[0], []).append((_key, _nutrient))
+for _candidates in _LABEL_CANDIDATES.values():
+    _candidates.sort(key=lambda candidate: len(candidate[0]), reverse=True)
+
+# One scan of the lowercased text yields words and numbers (with an optional unit)
+_TOKEN_RE = re.compile(
+    r'([a-zµ]+)\.?'
+    r'|(\d+(?:[.,]\d+)?)\s*(kcal|kj|mcg|µg|mg|gm|g|%)?(?![a-z])'
+)
+
+_MASS_TO_GRAMS = {None: 1.0, 'g': 1.0, 'gm': 1.0, 'mg': 1e-3, 'mcg': 1e-6, 'µg': 1e-6}
+
+KJ_PER_KCAL = 4.184
+SALT_PER_SODIUM = 2.5
+
+def _match_label(tokens, i):
+    """
+    Match the longest nutrient label starting at tokens[i].
+
+    Returns:
+        tuple: (nutrient key or None for ignored labels, number of words
+        matched), or None if no label starts here
+    """
+    for key, nutrient in _LABEL_CANDIDATES.get(tokens[i][0], ()):
+        size = len(key)
+        if size == 1 or tuple(token[0] for token in tokens[i:i + size]) == key:
+            return nutrient, size
+    return None
+
+def find_nutrient(text):
+    """
+    Find the nutrient named in a piece of text, such as a table row label.
+
+    Args:
+        text (str): Label text, e.g. "of which Saturated Fat"
+
+    Returns:
+        str: The nutrient key (e.g. 'saturated_fat', or 'sodium'), or None if
+        the text names no nutrient or one that is not reported
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    for i, (word, _, _) in enumerate(tokens):
+        if word:
+            match = _match_label(tokens, i)
+            if match:
+                return match[0]
+    return None
+
+def parse_amounts(text):
+    """
+    Extract the amounts in a piece of text, such as one table cell.
+
+    Args:
+        text (str): Cell text, e.g. "1950 kJ / 466 kcal"
+
+    Returns:
+        list: (value, unit) tuples; unit is None when not printed. Percent
+        values are skipped.
+    """
+    return [
+        (float(number.replace(',', '.')), unit or None)
+        for _, number, unit in _TOKEN_RE.findall(text.lower())
+        if number and unit != '%'
+    ]
+
+def normalize_amount(nutrient, value, unit):
+    """
+    Convert an amount to the unit the parser reports for its nutrient.
+
+    Energy is reported in kcal and everything else in grams; sodium is
+    converted to salt.
+
+    Returns:
+        tuple: (nutrient key, value), or None if the unit does not fit the nutrient
+    """
+    if nutrient == 'energy_kcal':
+        if unit == 'kj':
+            return nutrient, round(value / KJ_PER_KCAL, 1)
+        if unit in (None, 'kcal'):
+            return nutrient, value
+        return None
+
+    if unit not in _MASS_TO_GRAMS:
+        return None
+    grams = value * _MASS_TO_GRAMS[unit]
+    if nutrient == 'sodium':
+        return 'salt', round(grams * SALT_PER_SODIUM, 4)
+    return nutrient, grams
+
+def parse_label(text):
+    """
+    Parse nutrition values from label text in a single pass.
+
+    Values are normalised to kcal for energy and grams for everything else;
+    kJ, mg and mcg values are converted and sodium is converted to salt.
+    Decimal commas ("12,5 g") are accepted.
+
+    Args:
+        text (str): OCR text of a nutrition label
+
+    Returns:
+        dict: Nutrient values found, keyed by the names in NUTRIENTS
+    """
+    results = {}
+    energy_kj = None
+    sodium = None
+    current = None
+
+    tokens = _TOKEN_RE.findall(text.lower())
+    skip = 0
+    for i, (word, number, unit) in enumerate(tokens):
+        if skip:
+            skip -= 1
+            continue
+
+        if word:
+            # Words between a label and its value are ignored
+            match = _match_label(tokens, i)
+            if match:
+                current, size = match
+                skip = size - 1
+            continue
+
+        unit = unit or None
+        if unit == '%':
+            continue  # Percent of daily value, not an amount
+
+        value = float(number.replace(',', '.'))
+
+        if current is None:
+            # A bare "250 kcal" still tells us the energy
+            if unit == 'kcal' and 'energy_kcal' not in results:
+                results['energy_kcal'] = value
+            continue
+
+        if current == 'energy_kcal':
+            if unit == 'kj':
+                # Keep looking for an explicit kcal value after the kJ one
+                if energy_kj is None:
+                    energy_kj = value
+                continue
+            if unit in (None, 'kcal') and 'energy_kcal' not in results:
+                results['energy_kcal'] = value
+        elif unit in _MASS_TO_GRAMS:
+            grams = value * _MASS_TO_GRAMS[unit]
+            if current == 'sodium':
+                if sodium is None:
+                    sodium = grams
+            elif current not in results:
+                results[current] = grams
+
+        current = None
+
+    if 'energy_kcal' not in results and energy_kj is not None:
+        results['energy_kcal'] = round(energy_kj / KJ_PER_KCAL, 1)
+    if 'salt' not in results and sodium is not None:
+        results['salt'] = round(sodium * SALT_PER_SODIUM, 4)
+
+    return results
@@ -0,0 +1,177 @@
+"""
+Tesseract OCR backends.
+
+The pytesseract backend runs the tesseract binary once per call, which
+reloads the language model and round-trips the image through a temp file.
+The tesserocr backend keeps a tesseract engine alive in-process (one per
+thread, since an engine is not thread-safe) and hands it NumPy buffers
+directly, so the model is loaded once per worker.
+
+Both backends take the same structured pass options:
+    {'oem': 3, 'psm': 6, 'whitelist': '...', 'lang': 'eng', 'tessdata_dir': '...'}
+and report recognised words as WordBox tuples.
+"""
+import logging
+import threading
+from collections import namedtuple
+import cv2
+import numpy as np
+import pytesseract
+from config.ocr import OCR_SETTINGS
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# One recognised word: its text, tesseract confidence (0-100) and bounding box in pixels
+WordBox = namedtuple('WordBox', ['text', 'conf', 'left', 'top', 'width', 'height'])
+
+def _parse_words(data):
+    """Turn image_to_data output into WordBox tuples, skipping empty boxes."""
+    words = []
+    for i, text in enumerate(data['text']):
+        text = text.strip()
+        try:
+            conf = float(data['conf'][i])
+        except (TypeError, ValueError):
+            continue
+        if text and conf >= 0:
+            words.append(WordBox(text, conf, data['left'][i], data['top'][i], data['width'][i], data['height'][i]))
+    return words
+
+class PytesseractBackend:
+    """Runs the tesseract command line tool through pytesseract for every call."""
+
+    name = 'pytesseract'
+
+    @staticmethod
+    def build_config(options):
+        """Build the tesseract command line options for a pass."""
+        parts = [f"--oem {options['oem']}", f"--psm {options['psm']}"]
+        if options.get('whitelist'):
+            parts.append(f"-c tessedit_char_whitelist=\"{options['whitelist']}\"")
+        if options.get('tessdata_dir'):
+            parts.append(f"--tessdata-dir \"{options['tessdata_dir']}\"")
+        if options.get('dpi'):
+            parts.append(f"--dpi {options['dpi']}")
+        parts.append(f"-l {options.get('lang', 'eng')}")
+        return ' '.join(parts)
+
+    def image_to_string(self, img, options):
+        return pytesseract.image_to_string(img, config=self.build_config(options))
+
+    def image_to_words(self, img, options):
+        data = pytesseract.image_to_data(
+            img, config=self.build_config(options), output_type=pytesseract.Output.DICT)
+        return _parse_words(data)
+
+class TesserocrBackend:
+    """
+    Keeps tesseract engines alive in-process via tesserocr.
+
+    Engines are cached per thread and per (tessdata, lang, oem) since those
+    can only be set when an engine is initialised; page segmentation mode
+    and whitelist are changed on the cached engine for each call.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self):
+        if tesserocr is None:
+            raise ImportError("tesserocr is not installed")
+        self._local = threading.local()
+
+    def _engine(self, options):
+        engines = getattr(self._local, 'engines', None)
+        if engines is None:
+            engines = self._local.engines = {}
+
+        key = (options.get('tessdata_dir'), options.get('lang', 'eng'), options['oem'])
+        api = engines.get(key)
+        if api is None:
+            kwargs = {'lang': key[1], 'oem': key[2]}
+            if key[0]:
+                kwargs['path'] = key[0]
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            engines[key] = api
+            logger.info(f"Loaded in-process tesseract engine (lang={key[1]}, oem={key[2]})")
+
+        api.SetPageSegMode(options['psm'])
+        api.SetVariable('tessedit_char_whitelist', options.get('whitelist') or '')
+        return api
+
+    def _set_image(self, api, img, options):
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        img = np.ascontiguousarray(img)
+        height, width = img.shape[:2]
+        channels = 1 if img.ndim == 2 else img.shape[2]
+        api.SetImageBytes(img.tobytes(), width, height, channels, width * channels)
+        if options.get('dpi'):
+            api.SetSourceResolution(options['dpi'])
+
+    def image_to_string(self, img, options):
+        api = self._engine(options)
+        self._set_image(api, img, options)
+        return api.GetUTF8Text()
+
+    def image_to_words(self, img, options):
+        api = self._engine(options)
+        self._set_image(api, img, options)
+        api.Recognize()
+
+        words = []
+        level = tesserocr.RIL.WORD
+        for result in tesserocr.iterate_level(api.GetIterator(), level):
+            text = (result.GetUTF8Text(level) or '').strip()
+            conf = result.Confidence(level)
+            box = result.BoundingBox(level)
+            if text and conf >= 0 and box:
+                x1, y1, x2, y2 = box
+                words.append(WordBox(text, conf, x1, y1, x2 - x1, y2 - y1))
+        return words
+
+BACKENDS = {
+    'pytesseract': PytesseractBackend,
+    'tesserocr': TesserocrBackend,
+}
+
+def create_backend(name):
+    """
+    Create an OCR backend by name.
+
+    Args:
+        name (str): 'tesserocr', 'pytesseract' or 'auto' (tesserocr when
+            installed, otherwise pytesseract)
+
+    Returns:
+        The backend instance
+    """
+    if name == 'auto':
+        name = 'tesserocr' if tesserocr is not None else 'pytesseract'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    return BACKENDS[name]()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_ocr_backend():
+    """
+    Get the OCR backend of this process, creating it on first use.
+
+    Each OCR worker process builds its own backend, so in-process engines
+    are loaded once per worker and reused for every later pass.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            try:
+                _backend = create_backend(OCR_SETTINGS['BACKEND'])
+            except ImportError as e:
+                logger.warning(f"{str(e)}, falling back to pytesseract")
+                _backend = PytesseractBackend()
+        return _backend
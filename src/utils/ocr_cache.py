@@ -0,0 +1,261 @@
+"""
+Persistent cache of OCR results for previously seen label images.
+
+Results are keyed by a perceptual hash of the nutrition table region (after
+it has been cropped and straightened), so re-uploads of the same label,
+even re-encoded or slightly re-framed, are answered instantly. An image
+match is only accepted when the barcodes entered with both uploads agree
+(or neither had one), and a barcode alone only answers from a result that
+read every core nutrient. Each result records the strength of the OCR
+profile that produced it, and only answers requests for a profile of the
+same or lower strength, so a quick scan never stands in for a thorough one.
+The ranked alternative results of the scan are cached with it, so a cache
+hit offers the same choices on the verify page as the original scan.
+
+The 256-bit hash is split into bands that are indexed separately: any hash
+within the match distance shares at least one band exactly with the query
+(pigeonhole), so lookups only compare the rows found through the index.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import cv2
+from config.ocr import OCR_SETTINGS
+from utils.cache import register_cache
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 16  # 16x16 grid -> 256-bit hash
+HASH_BITS = HASH_SIZE * HASH_SIZE
+BANDS = 8
+_BAND_BITS = HASH_BITS // BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+def image_dhash(image, hash_size=HASH_SIZE):
+    """
+    Compute a difference hash (dHash) of an image.
+
+    Near-duplicate images produce hashes that differ in only a few bits.
+
+    Args:
+        image: BGR or grayscale image as a NumPy array
+        hash_size (int): Width/height of the hash grid (hash_size ** 2 bits)
+
+    Returns:
+        int: The perceptual hash
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    diff = small[:, 1:] > small[:, :-1]
+
+    value = 0
+    for bit in diff.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+def hash_bands(phash):
+    """Split a hash into BANDS integers for the band index."""
+    return [(phash >> (band * _BAND_BITS)) & _BAND_MASK for band in range(BANDS)]
+
+class OCRResultCache:
+    """
+    SQLite-backed OCR result cache with an LRU size cap and hit-rate counters.
+    """
+
+    def __init__(self, path, max_entries=2000, max_distance=4, name='ocr.results'):
+        self.name = name
+        self.path = path
+        self.max_entries = max_entries
+        # A match must share a band with the query, which only holds up to BANDS - 1 differing bits
+        self.max_distance = min(max_distance, BANDS - 1)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ocr_results)")}
+            if columns and 'complete' not in columns:
+                # Entries keyed by the old full-frame 64-bit hash cannot be matched any more
+                conn.execute("DROP TABLE ocr_results")
+                columns = set()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    phash TEXT NOT NULL,
+                    barcode TEXT,
+                    result TEXT NOT NULL,
+                    complete INTEGER NOT NULL DEFAULT 0,
+                    profile TEXT,
+                    strength INTEGER,
+                    candidates TEXT,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            if columns and 'strength' not in columns:
+                # Older entries do not record their profile; NULL strength never answers a lookup
+                conn.execute("ALTER TABLE ocr_results ADD COLUMN profile TEXT")
+                conn.execute("ALTER TABLE ocr_results ADD COLUMN strength INTEGER")
+            if columns and 'candidates' not in columns:
+                conn.execute("ALTER TABLE ocr_results ADD COLUMN candidates TEXT")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr_hash_bands (
+                    band INTEGER NOT NULL,
+                    value INTEGER NOT NULL,
+                    result_id INTEGER NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_hash_bands ON ocr_hash_bands (band, value)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_hash_bands_result ON ocr_hash_bands (result_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_results_barcode ON ocr_results (barcode, complete)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_results_last_used ON ocr_results (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection, committing on success and always closing it."""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, phash, barcode=None, min_strength=0):
+        """
+        Find a cached OCR result for a table image hash and barcode.
+
+        An image match must have been stored under the same barcode (or
+        without one when `barcode` is None). Without an image match, a
+        barcode answers only from a result marked complete. Either way the
+        result must come from a profile of at least `min_strength`.
+
+        Args:
+            phash (int): Perceptual hash of the cropped nutrition table
+            barcode (str): Optional barcode entered with the upload
+            min_strength (int): Strength of the requested OCR profile
+
+        Returns:
+            tuple: (cached nutrition values, ranked alternative value sets),
+            or None on a miss
+        """
+        with self._connect() as conn:
+            # Rows sharing at least one band with the query, found through the band index
+            band_filter = ' OR '.join('(b.band = ? AND b.value = ?)' for _ in range(BANDS))
+            params = [value for band, band_value in enumerate(hash_bands(phash)) for value in (band, band_value)]
+            rows = conn.execute(f"""
+                SELECT DISTINCT r.id, r.phash, r.result, r.candidates FROM ocr_hash_bands b
+                JOIN ocr_results r ON r.id = b.result_id
+                WHERE ({band_filter}) AND r.barcode IS ? AND r.strength >= ?
+            """, params + [barcode, min_strength]).fetchall()
+
+            row = None
+            best_distance = self.max_distance + 1
+            for row_id, stored_hash, result, candidates in rows:
+                distance = hamming_distance(phash, int(stored_hash, 16))
+                if distance < best_distance:
+                    best_distance = distance
+                    row = (row_id, result, candidates)
+
+            if row is None and barcode:
+                row = conn.execute(
+                    "SELECT id, result, candidates FROM ocr_results WHERE barcode = ? AND complete = 1 AND strength >= ? "
+                    "ORDER BY last_used DESC LIMIT 1",
+                    (barcode, min_strength)
+                ).fetchone()
+
+            if row is None:
+                self._count(False)
+                return None
+
+            conn.execute("UPDATE ocr_results SET last_used = ? WHERE id = ?", (time.time(), row[0]))
+
+        self._count(True)
+        result = json.loads(row[1])
+        # Entries stored before candidates were cached only have the merged result
+        return result, json.loads(row[2]) if row[2] else [result]
+
+    def store(self, phash, result, barcode=None, profile=None, strength=0, complete=False, candidates=None):
+        """
+        Cache the OCR result of an image, evicting least recently used entries past the cap.
+
+        Args:
+            phash (int): Perceptual hash of the cropped nutrition table
+            result (dict): Nutrition values
+            barcode (str): Optional barcode entered with the upload
+            profile (str): Name of the OCR profile that produced the result
+            strength (int): Strength of that profile; the result only answers
+                lookups asking for this strength or less
+            complete (bool): Whether the result read every core nutrient, which
+                lets later uploads with the same barcode reuse it
+            candidates (list): Ranked alternative value sets of the scan,
+                returned with the result on a hit
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO ocr_results "
+                "(phash, barcode, result, complete, profile, strength, candidates, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (format(phash, f'0{HASH_BITS // 4}x'), barcode, json.dumps(result), int(complete),
+                 profile, strength, json.dumps(candidates) if candidates else None, now, now)
+            )
+            conn.executemany(
+                "INSERT INTO ocr_hash_bands (band, value, result_id) VALUES (?, ?, ?)",
+                [(band, value, cursor.lastrowid) for band, value in enumerate(hash_bands(phash))]
+            )
+            evicted = conn.execute("""
+                DELETE FROM ocr_results WHERE id NOT IN (
+                    SELECT id FROM ocr_results ORDER BY last_used DESC LIMIT ?
+                )
+            """, (self.max_entries,)).rowcount
+            if evicted:
+                conn.execute("DELETE FROM ocr_hash_bands WHERE result_id NOT IN (SELECT id FROM ocr_results)")
+
+    def stats(self):
+        """Return hit/miss counters for this process and the current number of entries."""
+        with self._connect() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': size,
+                'max_size': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+def get_ocr_cache():
+    """Get the process-wide OCR result cache, or None when it is disabled."""
+    global _ocr_cache
+    if not OCR_SETTINGS['RESULT_CACHE_ENABLED']:
+        return None
+    with _ocr_cache_lock:
+        if _ocr_cache is None:
+            _ocr_cache = register_cache(OCRResultCache(
+                OCR_SETTINGS['RESULT_CACHE_PATH'],
+                max_entries=OCR_SETTINGS['RESULT_CACHE_SIZE'],
+                max_distance=OCR_SETTINGS['RESULT_CACHE_MAX_DISTANCE']
+            ))
+        return _ocr_cache
@@ -0,0 +1,233 @@
+"""
+Background OCR jobs.
+
+Uploads enqueue a job and return immediately; a worker pool runs
+extract_text and the result is polled by the verify page. Alternative
+results from individual OCR configs are kept with the job, so the verify
+page can offer them without running OCR again. Job state lives
+in a pluggable backend: in-process memory for a single worker, or a local
+SQLite database shared by every worker process on the host, so a poll
+that reaches another worker still finds the job.
+
+A job runs on the threads of the worker that accepted the upload. If that
+worker dies, its jobs stop making progress; once they have been idle for
+JOB_TIMEOUT seconds they are reported as failed instead of pending forever.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from config.ocr import OCR_SETTINGS
+from utils.image_processing import extract_text_candidates
+
+logger = logging.getLogger(__name__)
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+class InProcessJobBackend:
+    """Keeps job state in memory; only visible to the process that created the job."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, image_path, barcode=None):
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': PENDING,
+                'image_path': image_path,
+                'barcode': barcode,
+                'result': None,
+                'candidates': [],
+                'error': None,
+                'created_at': now,
+                'updated_at': now
+            }
+
+    def update(self, job_id, status, result=None, error=None, candidates=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status=status, result=result, error=error,
+                           candidates=candidates or [], updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def prune(self, max_age):
+        cutoff = time.time() - max_age
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items() if job['updated_at'] < cutoff]:
+                del self._jobs[job_id]
+
+class SQLiteJobBackend:
+    """Keeps job state in a local SQLite database shared by all worker processes."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    image_path TEXT NOT NULL,
+                    barcode TEXT,
+                    result TEXT,
+                    candidates TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # Databases created before candidates were stored lack the column
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ocr_jobs)")}
+            if 'candidates' not in columns:
+                conn.execute("ALTER TABLE ocr_jobs ADD COLUMN candidates TEXT")
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection, committing on success and always closing it."""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, job_id, image_path, barcode=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO ocr_jobs (id, status, image_path, barcode, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, PENDING, image_path, barcode, now, now)
+            )
+
+    def update(self, job_id, status, result=None, error=None, candidates=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ocr_jobs SET status = ?, result = ?, candidates = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None,
+                 json.dumps(candidates or []), error, time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM ocr_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['candidates'] = json.loads(job['candidates']) if job['candidates'] else []
+        return job
+
+    def prune(self, max_age):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ocr_jobs WHERE updated_at < ?", (time.time() - max_age,))
+
+class OCRJobQueue:
+    """
+    Runs OCR jobs on a pool of worker threads and records their state in a backend.
+    """
+
+    def __init__(self, backend, workers=2, job_ttl=3600, job_timeout=300):
+        self.backend = backend
+        self.job_ttl = job_ttl
+        self.job_timeout = job_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr-job')
+
+    def submit(self, image_path, barcode=None, image=None, profile=None):
+        """
+        Enqueue OCR for an uploaded image.
+
+        Args:
+            image_path (str): Path of the saved upload
+            barcode (str): Optional barcode entered with the upload
+            image: Optional decoded image; when given it is OCR'd directly
+                instead of reading image_path back from disk
+            profile (str): Optional OCR profile name (see OCR_PROFILES)
+
+        Returns:
+            str: The job id used to poll for the result
+        """
+        job_id = uuid.uuid4().hex
+        self.backend.create(job_id, image_path, barcode)
+        self._executor.submit(self._run, job_id, image if image is not None else image_path, barcode, profile)
+
+        # Forget old jobs so the backend does not grow without bound
+        try:
+            self.backend.prune(self.job_ttl)
+        except Exception as e:
+            logger.warning(f"Could not prune old OCR jobs: {str(e)}")
+
+        return job_id
+
+    def get(self, job_id):
+        """
+        Return the job record (id, status, result, candidates, error, ...) or None if unknown.
+
+        A pending or running job that has not progressed for job_timeout
+        seconds is marked failed first.
+        """
+        job = self.backend.get(job_id)
+        if job is not None and job['status'] in (PENDING, RUNNING) \
+                and time.time() - job['updated_at'] > self.job_timeout:
+            logger.warning(f"OCR job {job_id} made no progress for {self.job_timeout}s, marking it failed")
+            error = "OCR did not finish; the worker running it may have restarted"
+            self.backend.update(job_id, FAILED, error=error)
+            job.update(status=FAILED, result=None, candidates=[], error=error)
+        return job
+
+    def _run(self, job_id, image, barcode=None, profile=None):
+        self.backend.update(job_id, RUNNING)
+        try:
+            result, candidates = extract_text_candidates(image, barcode, profile)
+            self.backend.update(job_id, DONE, result=result, candidates=candidates)
+        except Exception as e:
+            logger.error(f"OCR job {job_id} failed: {str(e)}")
+            self.backend.update(job_id, FAILED, error=str(e))
+
+def create_backend(name):
+    """Create a job backend by name ('memory' or 'sqlite')."""
+    if name == 'memory':
+        if OCR_SETTINGS['WEB_WORKERS'] == 1:
+            return InProcessJobBackend()
+        # Polls reach other workers, which would not know the job
+        logger.warning(f"The 'memory' OCR job backend needs a single web worker, "
+                       f"using 'sqlite' for {OCR_SETTINGS['WEB_WORKERS']} workers")
+        name = 'sqlite'
+    if name == 'sqlite':
+        return SQLiteJobBackend(OCR_SETTINGS['JOB_DB_PATH'])
+    raise ValueError(f"Unknown OCR job backend: {name}")
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Get the process-wide OCR job queue, creating it on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = OCRJobQueue(
+                create_backend(OCR_SETTINGS['JOB_BACKEND']),
+                workers=OCR_SETTINGS['JOB_WORKERS'],
+                job_ttl=OCR_SETTINGS['JOB_TTL'],
+                job_timeout=OCR_SETTINGS['JOB_TIMEOUT']
+            )
+        return _job_queue
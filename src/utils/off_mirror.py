@@ -0,0 +1,386 @@
+"""
+Local mirror of Open Food Facts products.
+
+The products EatFit serves are mostly Indian packaged goods, a small and
+stable subset of Open Food Facts. They are imported from the OFF data dump
+(JSONL or CSV) into a SQLite file keyed by barcode, with secondary indexes
+on category tags and Nutri-Score grade, so that barcode lookups and
+alternative searches are answered locally and keep working when the OFF
+API is slow or down. The API is only used for products missing here.
+"""
+import csv
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from config.openfoodfacts import OFF_CONFIG
+from utils.gtin import normalize_gtin
+
+logger = logging.getLogger(__name__)
+
+# Product fields used by the analysis, allergy and alternatives code; the rest of a dump record is dropped
+PRODUCT_FIELDS = (
+    'code', 'product_name', 'brands', 'image_url', 'serving_size', 'quantity',
+    'categories', 'categories_tags', 'categories_hierarchy', 'countries_tags',
+    'nutriments', 'nutrition_grades', 'nutriscore_grade', 'nova_group', 'nova_groups',
+    'ingredients_text', 'ingredients_analysis_tags', 'ingredients_from_palm_oil_n', 'vegan',
+    'additives_tags', 'additives_original_tags', 'additives_old_tags',
+    'allergens_tags', 'traces_tags', 'unique_scans_n', 'last_modified_t',
+)
+
+# CSV dump columns holding comma-separated tag lists
+_CSV_TAG_COLUMNS = (
+    'categories_tags', 'countries_tags', 'additives_tags', 'allergens_tags',
+    'traces_tags', 'ingredients_analysis_tags',
+)
+_CSV_INT_COLUMNS = ('nova_group', 'unique_scans_n', 'last_modified_t', 'ingredients_from_palm_oil_n')
+
+def normalize_tag(tag):
+    """Turn 'India' or 'en:india' into the OFF tag form 'en:india'."""
+    tag = tag.strip().lower().replace(' ', '-')
+    return tag if ':' in tag else f'en:{tag}'
+
+def product_barcode(product):
+    """Key a dump product by its barcode, normalized like lookups when it is a valid GTIN."""
+    code = str(product.get('code') or '').strip()
+    return normalize_gtin(code) or code
+
+def _nutrition_grade(product):
+    grade = (product.get('nutrition_grades') or product.get('nutriscore_grade') or '').lower()
+    return grade if grade in ('a', 'b', 'c', 'd', 'e') else None
+
+def _as_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def _trim_product(product):
+    """Keep only the fields EatFit reads from a dump record."""
+    return {field: product[field] for field in PRODUCT_FIELDS if product.get(field) not in (None, '', [])}
+
+def _csv_product(row):
+    """Build an API-shaped product dict from a row of the tab-separated CSV dump."""
+    product = {}
+    nutriments = {}
+    for column, value in row.items():
+        if not value or column is None:
+            continue
+        if column.endswith('_100g'):
+            try:
+                nutriments[column] = float(value)
+            except ValueError:
+                pass
+        elif column in _CSV_TAG_COLUMNS:
+            product[column] = [tag for tag in value.split(',') if tag]
+        elif column in _CSV_INT_COLUMNS:
+            product[column] = _as_int(value)
+        elif column in PRODUCT_FIELDS:
+            product[column] = value
+    if nutriments:
+        product['nutriments'] = nutriments
+    if 'categories_tags' in product:
+        product.setdefault('categories_hierarchy', product['categories_tags'])
+    return product
+
+def _open_dump(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+def iter_dump_products(path):
+    """
+    Stream products from an OFF data dump without loading it into memory.
+
+    Args:
+        path (str): JSONL or tab-separated CSV dump, optionally gzipped
+            (e.g. openfoodfacts-products.jsonl.gz, en.openfoodfacts.org.products.csv.gz)
+
+    Yields:
+        dict: Products in the same shape as the API's 'product' object
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    is_csv = name.endswith(('.csv', '.tsv'))
+    with _open_dump(path) as f:
+        if is_csv:
+            csv.field_size_limit(sys.maxsize)
+            for row in csv.DictReader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                yield _csv_product(row)
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping malformed dump line {line_number}")
+
+def matches_filters(product, countries=None, categories=None):
+    """
+    Check a product against the import filters.
+
+    Args:
+        product (dict): Dump product
+        countries (list): Country tags; the product must be sold in one of them
+        categories (list): Category tags; the product must be in one of them
+
+    Returns:
+        bool: True if the product should be imported
+    """
+    if countries and not set(product.get('countries_tags') or []) & set(countries):
+        return False
+    if categories and not set(product.get('categories_tags') or []) & set(categories):
+        return False
+    return True
+
+class ProductStore:
+    """
+    SQLite store of OFF products keyed by barcode.
+
+    Reads use one long-lived connection per thread so a lookup is a single
+    indexed query; writes use short-lived connections. WAL mode lets the
+    importer write while the app keeps reading.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS products (
+                    barcode TEXT PRIMARY KEY,
+                    product TEXT NOT NULL,
+                    nutrition_grade TEXT,
+                    popularity INTEGER NOT NULL DEFAULT 0,
+                    last_modified_t INTEGER,
+                    imported_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS product_categories (
+                    category_tag TEXT NOT NULL,
+                    barcode TEXT NOT NULL,
+                    PRIMARY KEY (category_tag, barcode)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_products_grade ON products (nutrition_grade, popularity)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_product_categories_barcode ON product_categories (barcode)")
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection, committing on success and always closing it."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _reader(self):
+        """Get this thread's read connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+        return conn
+
+    def get(self, barcode):
+        """
+        Look up a product by barcode.
+
+        Returns:
+            dict: A fresh copy of the stored product, or None if it is not mirrored
+        """
+        row = self._reader().execute(
+            "SELECT product FROM products WHERE barcode = ?", (barcode,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def search_category(self, category_tag, grades, limit=10):
+        """
+        Find the most scanned products of a category with one of the given Nutri-Score grades.
+
+        Args:
+            category_tag (str): OFF category tag, e.g. 'en:biscuits'
+            grades (list): Lowercase grades, e.g. ['a', 'b']
+            limit (int): Maximum number of products returned
+
+        Returns:
+            list: Product dicts, most popular first
+        """
+        placeholders = ','.join('?' * len(grades))
+        rows = self._reader().execute(f"""
+            SELECT p.product FROM product_categories c
+            JOIN products p ON p.barcode = c.barcode
+            WHERE c.category_tag = ? AND p.nutrition_grade IN ({placeholders})
+            ORDER BY p.popularity DESC
+            LIMIT ?
+        """, (category_tag, *grades, limit)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def upsert(self, products):
+        """
+        Insert or update products in one transaction.
+
+        A product already stored with a newer `last_modified_t` is left
+        untouched, so replaying a dump or delta file is harmless.
+
+        Args:
+            products (list): Dump products; entries without a barcode are skipped
+
+        Returns:
+            list: Barcodes that were inserted or changed
+        """
+        now = time.time()
+        written = []
+        with self._connect() as conn:
+            for product in products:
+                barcode = product_barcode(product)
+                if not barcode:
+                    continue
+                product = _trim_product(product)
+                cursor = conn.execute("""
+                    INSERT INTO products
+                        (barcode, product, nutrition_grade, popularity, last_modified_t, imported_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (barcode) DO UPDATE SET
+                        product = excluded.product,
+                        nutrition_grade = excluded.nutrition_grade,
+                        popularity = excluded.popularity,
+                        last_modified_t = excluded.last_modified_t,
+                        imported_at = excluded.imported_at
+                    WHERE products.last_modified_t IS NULL
+                        OR excluded.last_modified_t IS NULL
+                        OR excluded.last_modified_t >= products.last_modified_t
+                """, (
+                    barcode, json.dumps(product, separators=(',', ':')), _nutrition_grade(product),
+                    _as_int(product.get('unique_scans_n')) or 0, _as_int(product.get('last_modified_t')), now
+                ))
+                if not cursor.rowcount:
+                    continue  # The stored copy is newer
+                conn.execute("DELETE FROM product_categories WHERE barcode = ?", (barcode,))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO product_categories (category_tag, barcode) VALUES (?, ?)",
+                    [(tag, barcode) for tag in product.get('categories_tags') or []]
+                )
+                written.append(barcode)
+        return written
+
+    def existing(self, barcodes):
+        """Return the subset of `barcodes` that is already mirrored."""
+        barcodes = [b for b in barcodes if b]
+        if not barcodes:
+            return set()
+        placeholders = ','.join('?' * len(barcodes))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT barcode FROM products WHERE barcode IN ({placeholders})", barcodes
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def get_state(self, key, default=None):
+        """Read a sync bookkeeping value, e.g. the delta watermark."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        """Write a sync bookkeeping value."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, str(value), time.time())
+            )
+
+    def count(self):
+        """Number of mirrored products."""
+        return self._reader().execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+def import_dump(store, path, countries=None, categories=None, batch_size=None):
+    """
+    Stream an OFF data dump into the store, keeping products that match the filters.
+
+    Args:
+        store (ProductStore): Target store
+        path (str): JSONL or CSV dump, optionally gzipped
+        countries (list): Country tags or names to keep; defaults to OFF_CONFIG['MIRROR_COUNTRIES']
+        categories (list): Category tags or names to keep; defaults to OFF_CONFIG['MIRROR_CATEGORIES']
+        batch_size (int): Products written per transaction
+
+    Returns:
+        tuple: (products read, products imported)
+    """
+    if countries is None:
+        countries = OFF_CONFIG['MIRROR_COUNTRIES']
+    if categories is None:
+        categories = OFF_CONFIG['MIRROR_CATEGORIES']
+    if batch_size is None:
+        batch_size = OFF_CONFIG['MIRROR_BATCH_SIZE']
+    countries = [normalize_tag(c) for c in countries]
+    categories = [normalize_tag(c) for c in categories]
+
+    read = imported = 0
+    batch = []
+    for product in iter_dump_products(path):
+        read += 1
+        if matches_filters(product, countries, categories):
+            batch.append(product)
+        if len(batch) >= batch_size:
+            imported += len(store.upsert(batch))
+            batch = []
+            logger.info(f"Imported {imported} of {read} products from {path}")
+    if batch:
+        imported += len(store.upsert(batch))
+
+    logger.info(f"Finished importing {path}: {imported} of {read} products kept")
+    return read, imported
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_product_store():
+    """
+    Get the process-wide product mirror.
+
+    Returns:
+        ProductStore: The mirror, or None when it is disabled or has not been imported yet
+    """
+    global _store
+    if not OFF_CONFIG['MIRROR_ENABLED']:
+        return None
+    with _store_lock:
+        if _store is None and os.path.exists(OFF_CONFIG['MIRROR_PATH']):
+            _store = ProductStore(OFF_CONFIG['MIRROR_PATH'])
+        return _store
+
+def get_mirrored_product(barcode):
+    """
+    Look up a product in the local mirror.
+
+    Errors are logged and treated as a miss so callers fall back to the API.
+
+    Returns:
+        dict: The product, or None if it is not mirrored
+    """
+    store = get_product_store()
+    if store is None:
+        return None
+    try:
+        return store.get(barcode)
+    except sqlite3.Error as e:
+        logger.warning(f"Product mirror lookup failed for {barcode}: {str(e)}")
+        return None
@@ -0,0 +1,257 @@
+"""
+Incremental sync of the local product mirror from Open Food Facts delta exports.
+
+OFF publishes a JSONL file of the products changed in each period, named
+openfoodfacts_products_<start>_<end>.json.gz and listed in index.txt next
+to them. Applying those files in order keeps the mirror current without
+reloading the full dump. The end timestamp of the last applied file is
+stored as a watermark, so an interrupted sync resumes at the first file it
+had not finished, and upserts skip products whose stored copy is newer,
+so re-applying a file is harmless.
+
+Only one process syncs a mirror at a time: a sync holds a lock file next
+to the database, and a web worker or command that finds it taken skips
+its run instead of applying the same files again.
+"""
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from config.openfoodfacts import OFF_CONFIG
+from utils.http_client import http_get
+from utils.off_mirror import iter_dump_products, matches_filters, normalize_tag, product_barcode
+
+try:
+    import fcntl
+except ImportError:  # Windows: run the sync_off_deltas command instead of in-app syncs
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = 'delta_watermark'
+
+_DELTA_NAME = re.compile(r'^openfoodfacts_products_(\d+)_(\d+)\.jsonl?(?:\.gz)?$')
+
+def parse_delta_name(name):
+    """
+    Read the covered period from a delta file name.
+
+    Returns:
+        tuple: (start, end) Unix timestamps, or None if the name is not a delta file
+    """
+    match = _DELTA_NAME.match(os.path.basename(name.strip()))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+def list_deltas(source):
+    """
+    List the delta files available from a source, oldest first.
+
+    Args:
+        source (str): Local directory of delta files, or the base URL of the OFF delta exports
+
+    Returns:
+        list: (start, end, name) tuples sorted by end timestamp
+    """
+    if os.path.isdir(source):
+        names = os.listdir(source)
+    else:
+        response = http_get(f"{source.rstrip('/')}/index.txt")
+        response.raise_for_status()
+        names = response.text.splitlines()
+
+    deltas = []
+    for name in names:
+        period = parse_delta_name(name)
+        if period:
+            deltas.append((period[0], period[1], os.path.basename(name.strip())))
+    return sorted(deltas, key=lambda delta: (delta[1], delta[0]))
+
+def _fetch_delta(source, name, workdir):
+    """Return a local path for a delta file, downloading it into `workdir` if needed."""
+    if os.path.isdir(source):
+        return os.path.join(source, name)
+
+    path = os.path.join(workdir, name)
+    with http_get(f"{source.rstrip('/')}/{name}", stream=True) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f)
+    return path
+
+def apply_delta(store, path, countries=None, categories=None, batch_size=None):
+    """
+    Upsert the changed products of one delta file into the store.
+
+    Products matching the import filters are added; products that no
+    longer match are still updated when they are already mirrored.
+
+    Args:
+        store (ProductStore): Target store
+        path (str): Delta file (JSONL, optionally gzipped)
+        countries (list): Country tags to keep; defaults to OFF_CONFIG['MIRROR_COUNTRIES']
+        categories (list): Category tags to keep; defaults to OFF_CONFIG['MIRROR_CATEGORIES']
+        batch_size (int): Products written per transaction
+
+    Returns:
+        list: Barcodes that were inserted or changed
+    """
+    if countries is None:
+        countries = OFF_CONFIG['MIRROR_COUNTRIES']
+    if categories is None:
+        categories = OFF_CONFIG['MIRROR_CATEGORIES']
+    if batch_size is None:
+        batch_size = OFF_CONFIG['MIRROR_BATCH_SIZE']
+    countries = [normalize_tag(c) for c in countries]
+    categories = [normalize_tag(c) for c in categories]
+
+    changed = []
+
+    def flush(batch):
+        mirrored = store.existing([product_barcode(product) for product in batch])
+        keep = [
+            product for product in batch
+            if matches_filters(product, countries, categories) or product_barcode(product) in mirrored
+        ]
+        # Each batch is its own short transaction, so lookups are never blocked for long
+        changed.extend(store.upsert(keep))
+
+    batch = []
+    for product in iter_dump_products(path):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return changed
+
+@contextmanager
+def _exclusive_sync(store):
+    """Hold the store's sync lock file if no other process does; yields whether it was acquired."""
+    if fcntl is None:
+        yield True
+        return
+
+    with open(store.path + '.sync.lock', 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def sync_deltas(store, source=None, on_change=None):
+    """
+    Apply every delta file newer than the store's watermark, oldest first.
+
+    The watermark is advanced after each file, so a sync interrupted part
+    way resumes from the file it was applying. If another process is
+    already syncing the store, nothing is applied.
+
+    Args:
+        store (ProductStore): Target store
+        source (str): Delta directory or URL; defaults to OFF_CONFIG['DELTA_SOURCE']
+        on_change (callable): Called with the changed barcodes after each file
+
+    Returns:
+        dict: {'files': files applied, 'changed': products changed, 'watermark': new watermark,
+        'skipped': True if another process held the sync lock}
+    """
+    if source is None:
+        source = OFF_CONFIG['DELTA_SOURCE']
+
+    with _exclusive_sync(store) as acquired:
+        if not acquired:
+            logger.info("Another process is syncing the product mirror, skipping this run")
+            return {'files': 0, 'changed': 0, 'watermark': int(store.get_state(WATERMARK_KEY, 0)), 'skipped': True}
+        return _apply_pending_deltas(store, source, on_change)
+
+def _apply_pending_deltas(store, source, on_change):
+    """Apply the delta files newer than the watermark; the caller holds the sync lock."""
+    watermark = int(store.get_state(WATERMARK_KEY, 0))
+    pending = [delta for delta in list_deltas(source) if delta[1] > watermark]
+    summary = {'files': 0, 'changed': 0, 'watermark': watermark, 'skipped': False}
+    if not pending:
+        logger.info(f"Product mirror is up to date (watermark {watermark})")
+        return summary
+
+    with tempfile.TemporaryDirectory(prefix='off-delta-') as workdir:
+        for start, end, name in pending:
+            path = _fetch_delta(source, name, workdir)
+            try:
+                changed = apply_delta(store, path)
+            finally:
+                if path.startswith(workdir):
+                    os.unlink(path)
+
+            store.set_state(WATERMARK_KEY, end)
+            summary['files'] += 1
+            summary['changed'] += len(changed)
+            summary['watermark'] = end
+            logger.info(f"Applied delta {name}: {len(changed)} products changed")
+
+            if changed and on_change is not None:
+                on_change(changed)
+    return summary
+
+def invalidate_cached_products(barcodes):
+    """Drop in-memory copies of changed products so the next lookup reads the mirror."""
+    from models.food_analysis import invalidate_cached_product
+    from utils.nutrition import invalidate_cached_alternatives
+
+    for barcode in barcodes:
+        invalidate_cached_product(barcode)
+    invalidate_cached_alternatives(barcodes)
+
+_sync_thread = None
+_sync_lock = threading.Lock()
+
+def start_delta_sync(store, interval=None, source=None):
+    """
+    Start a daemon thread that applies new delta files every `interval` seconds.
+
+    Changed products are evicted from this process's caches after each
+    file. Lookups keep reading the mirror while a sync runs. Every web
+    worker starts this thread, but the sync lock lets only one of them
+    apply a given run; the others skip it. Without fcntl (Windows) no
+    thread is started and the sync_off_deltas command must be scheduled.
+
+    Args:
+        store (ProductStore): Target store
+        interval (int): Seconds between syncs; defaults to OFF_CONFIG['DELTA_SYNC_INTERVAL']
+        source (str): Delta directory or URL
+
+    Returns:
+        threading.Thread: The sync thread, or None when the interval is 0
+    """
+    global _sync_thread
+    if interval is None:
+        interval = OFF_CONFIG['DELTA_SYNC_INTERVAL']
+    if interval <= 0:
+        return None
+    if fcntl is None:
+        logger.warning("In-app delta sync needs fcntl; schedule the sync_off_deltas command instead")
+        return None
+
+    def run():
+        while True:
+            try:
+                sync_deltas(store, source, on_change=invalidate_cached_products)
+            except Exception as e:
+                logger.error(f"Product mirror delta sync failed: {str(e)}")
+            time.sleep(interval)
+
+    with _sync_lock:
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=run, name='off-delta-sync', daemon=True)
+            _sync_thread.start()
+        return _sync_thread
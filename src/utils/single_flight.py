@@ -0,0 +1,217 @@
+"""
+Request coalescing (single-flight) for upstream fetches.
+
+When many users scan the same barcode at once, only the first caller
+fetches it; concurrent callers for the same key wait for that fetch and
+share its result. With a shared directory configured, workers on the same
+host also coalesce: the fetch runs under a per-key file lock and its
+result is left in a small JSON file that the other workers read instead
+of fetching again. Result files are removed once they expire, and lock
+files of keys that have not been fetched for a while are swept away, so
+the directory does not grow with every barcode ever scanned.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from config.openfoodfacts import OFF_CONFIG
+from utils.cache import register_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing stays within each worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps of the shared directory by each group
+SWEEP_INTERVAL = 60
+# Lock files unused for this many seconds are removed by the sweep
+LOCK_EXPIRY = 300
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one upstream call.
+
+    Results must be JSON-serializable when cross-worker coalescing is enabled.
+    """
+
+    def __init__(self, name, shared_dir=None, shared_ttl=10):
+        self.name = name
+        self.shared_dir = shared_dir if fcntl is not None else None
+        self.shared_ttl = shared_ttl
+        self._calls = {}  # key -> _Call in flight
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.saved_calls = 0         # Callers that waited on another thread's call
+        self.saved_shared_calls = 0  # Calls answered from another worker's result
+        self._last_sweep = 0
+
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+    def do(self, key, fn):
+        """
+        Return fn(), sharing one call among all concurrent callers with the same key.
+
+        Args:
+            key (str): Identifies the upstream request, e.g. a barcode
+            fn (callable): Performs the upstream request
+
+        Returns:
+            The result of fn() (the same object for every waiter)
+
+        Raises:
+            Whatever fn() raised, in every caller that waited on it
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.saved_calls += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.shared_dir:
+                call.result = self._run_shared(key, fn)
+                self._maybe_sweep()
+            else:
+                call.result = self._run(fn)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _run(self, fn):
+        with self._lock:
+            self.upstream_calls += 1
+        return fn()
+
+    def _run_shared(self, key, fn):
+        """Run fn() under a cross-worker file lock, reusing a fresh result left by another worker."""
+        path = os.path.join(self.shared_dir, f"{self.name}-{hashlib.sha1(key.encode('utf-8')).hexdigest()}")
+        with open(path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # The lock file's mtime records when the key was last used, for the sweep
+                os.utime(path + '.lock')
+                try:
+                    if time.time() - os.path.getmtime(path) < self.shared_ttl:
+                        with open(path, 'r', encoding='utf-8') as f:
+                            result = json.load(f)
+                        with self._lock:
+                            self.saved_shared_calls += 1
+                        return result
+                    os.remove(path)  # Expired: nobody may reuse it any more
+                except (OSError, ValueError):
+                    pass  # No fresh result from another worker
+
+                result = self._run(fn)
+                try:
+                    fd, tmp_path = tempfile.mkstemp(dir=self.shared_dir, prefix=f"{self.name}-", suffix='.tmp')
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump(result, f)
+                    os.replace(tmp_path, path)
+                except (OSError, TypeError) as e:
+                    logger.warning(f"Could not share {self.name} result with other workers: {str(e)}")
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _maybe_sweep(self):
+        """Sweep the shared directory if this group has not done so for SWEEP_INTERVAL seconds."""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+        try:
+            self._sweep(now)
+        except OSError as e:
+            logger.warning(f"Could not clean up shared {self.name} results: {str(e)}")
+
+    def _sweep(self, now):
+        """
+        Remove this group's expired result files and lock files unused for LOCK_EXPIRY seconds.
+
+        A lock file is only removed while no worker holds it; a worker that
+        opened it just before the removal at worst repeats one fetch.
+        """
+        prefix = f"{self.name}-"
+        for entry in os.scandir(self.shared_dir):
+            if not entry.name.startswith(prefix):
+                continue
+            try:
+                age = now - entry.stat().st_mtime
+                if entry.name.endswith('.lock'):
+                    if age < LOCK_EXPIRY:
+                        continue
+                    with open(entry.path, 'a') as lock_file:
+                        try:
+                            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except OSError:
+                            continue  # In use
+                        os.remove(entry.path)
+                elif age >= (LOCK_EXPIRY if entry.name.endswith('.tmp') else self.shared_ttl):
+                    # Results expire after shared_ttl; temporary files left by a crashed write after LOCK_EXPIRY
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # Removed by another worker
+
+    def stats(self):
+        """Return upstream and saved call counters."""
+        with self._lock:
+            requests = self.upstream_calls + self.saved_calls + self.saved_shared_calls
+            return {
+                'name': self.name,
+                'in_flight': len(self._calls),
+                'upstream_calls': self.upstream_calls,
+                'saved_calls': self.saved_calls + self.saved_shared_calls,
+                'saved_shared_calls': self.saved_shared_calls,
+                'saved_rate': round((requests - self.upstream_calls) / requests, 4) if requests else 0.0
+            }
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+def get_single_flight(name):
+    """
+    Get the process-wide single-flight group registered under `name`, creating it on first use.
+
+    Its counters are reported by cache_stats next to the caches.
+
+    Args:
+        name (str): Group name, e.g. 'flight.off.product'
+
+    Returns:
+        SingleFlight: The shared group
+    """
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            shared_dir = OFF_CONFIG['SINGLE_FLIGHT_DIR'] if OFF_CONFIG['SINGLE_FLIGHT_SHARED'] else None
+            group = _groups[name] = register_cache(SingleFlight(
+                name, shared_dir=shared_dir, shared_ttl=OFF_CONFIG['SINGLE_FLIGHT_SHARED_TTL']))
+        return group
@@ -0,0 +1,273 @@
+"""
+Nutrition table localization and geometric normalization.
+
+Phone shots of a package usually show the nutrition facts table as a small
+part of the frame, often at an angle. Cropping to the table and warping it
+to a fronto-parallel view before preprocessing means fewer pixels per OCR
+pass, straight text lines for tesseract and less background text to trip
+over.
+"""
+import logging
+import cv2
+import numpy as np
+from config.ocr import OCR_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Detection runs on a downscaled copy; the box is mapped back to full resolution
+_DETECTION_MAX_SIDE = 1000
+
+def _downscale(gray):
+    height, width = gray.shape[:2]
+    scale = min(1.0, _DETECTION_MAX_SIDE / max(height, width))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+def _largest_box(mask, min_area, max_area):
+    """Bounding box (x, y, w, h) of the largest contour whose box area is within bounds."""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    best = None
+    best_area = 0
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        area = w * h
+        if min_area <= area <= max_area and area > best_area:
+            best = (x, y, w, h)
+            best_area = area
+    return best
+
+def _find_ruled_table(gray, min_area, max_area):
+    """Find a table drawn with horizontal and vertical rules."""
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 5)
+    height, width = binary.shape
+
+    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(width // 30, 10), 1))
+    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(height // 30, 10)))
+    horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel)
+    vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, vertical_kernel)
+
+    # Join the rules into one blob per table
+    grid = cv2.dilate(cv2.bitwise_or(horizontal, vertical), cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+    return _largest_box(grid, min_area, max_area)
+
+def _find_text_block(gray, min_area, max_area):
+    """Find the largest dense block of text, for tables printed without rules."""
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    # Merge characters into lines, then lines into blocks
+    blocks = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1)))
+    blocks = cv2.morphologyEx(blocks, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (1, 15)))
+    return _largest_box(blocks, min_area, max_area)
+
+def find_nutrition_table(image):
+    """
+    Locate the nutrition facts table in a label photo.
+
+    Ruled tables are found from their horizontal and vertical lines; when
+    there are none, the largest dense block of text is used instead.
+
+    Args:
+        image: BGR or grayscale image as a NumPy array
+
+    Returns:
+        tuple: (x, y, w, h) of the table in image coordinates, or None if no
+        plausible region was found
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small, scale = _downscale(gray)
+
+    frame_area = small.shape[0] * small.shape[1]
+    min_area = frame_area * OCR_SETTINGS['TABLE_MIN_AREA']
+    max_area = frame_area * OCR_SETTINGS['TABLE_MAX_AREA']
+
+    box = _find_ruled_table(small, min_area, max_area)
+    if box is None:
+        box = _find_text_block(small, min_area, max_area)
+    if box is None:
+        return None
+
+    return tuple(int(round(v / scale)) for v in box)
+
+def crop_to_nutrition_table(image):
+    """
+    Crop a label photo to its nutrition table, with a small margin.
+
+    Args:
+        image: BGR image as a NumPy array
+
+    Returns:
+        The cropped image, or the original image when no table was found
+    """
+    try:
+        box = find_nutrition_table(image)
+    except cv2.error as e:
+        logger.warning(f"Nutrition table detection failed: {str(e)}")
+        return image
+
+    if box is None:
+        logger.info("No nutrition table region found, using the whole image")
+        return image
+
+    x, y, w, h = box
+    height, width = image.shape[:2]
+    margin = int(max(w, h) * 0.03)
+    x0, y0 = max(x - margin, 0), max(y - margin, 0)
+    x1, y1 = min(x + w + margin, width), min(y + h + margin, height)
+
+    logger.info(f"Cropped to nutrition table {x1 - x0}x{y1 - y0} of {width}x{height}")
+    return image[y0:y1, x0:x1]
+
+def _order_corners(points):
+    """Order four corner points as top-left, top-right, bottom-right, bottom-left."""
+    points = points.reshape(4, 2).astype(np.float32)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)]
+    ], dtype=np.float32)
+
+def find_table_quad(image):
+    """
+    Find the outline of a nutrition table seen at an angle.
+
+    Args:
+        image: BGR or grayscale image as a NumPy array
+
+    Returns:
+        numpy.ndarray: The four table corners (top-left, top-right,
+        bottom-right, bottom-left) in image coordinates, or None if no
+        convex quadrilateral of plausible size was found
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small, scale = _downscale(gray)
+
+    frame_area = small.shape[0] * small.shape[1]
+    min_area = frame_area * OCR_SETTINGS['TABLE_MIN_AREA']
+    max_area = frame_area * OCR_SETTINGS['TABLE_MAX_AREA']
+
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+        area = cv2.contourArea(contour)
+        if area < min_area:
+            break
+        if area > max_area:
+            continue
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            return _order_corners(approx) / scale
+    return None
+
+def warp_to_quad(image, corners):
+    """
+    Warp the region inside four corners to a fronto-parallel rectangle.
+
+    Args:
+        image: BGR image as a NumPy array
+        corners (numpy.ndarray): Corners as returned by find_table_quad
+
+    Returns:
+        The rectified region
+    """
+    top_left, top_right, bottom_right, bottom_left = corners
+    width = int(max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left)))
+    height = int(max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right)))
+
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(corners.astype(np.float32), target)
+    return cv2.warpPerspective(image, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_REPLICATE)
+
+def estimate_skew(image):
+    """
+    Estimate the dominant angle of the text lines in an image.
+
+    Characters are smeared horizontally into line blobs and the angle is the
+    median of the line segments found in them.
+
+    Args:
+        image: BGR or grayscale image as a NumPy array
+
+    Returns:
+        float: Angle in degrees (positive when lines rise to the right), or
+        0.0 if no text lines were found
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small, _ = _downscale(gray)
+
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    lines_mask = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3)))
+    segments = cv2.HoughLinesP(lines_mask, 1, np.pi / 360, threshold=100,
+                               minLineLength=small.shape[1] // 6, maxLineGap=10)
+    if segments is None:
+        return 0.0
+
+    angles = []
+    for x1, y1, x2, y2 in segments[:, 0]:
+        angle = -np.degrees(np.arctan2(y2 - y1, x2 - x1))
+        if abs(angle) <= OCR_SETTINGS['MAX_SKEW']:
+            angles.append(angle)
+    return float(np.median(angles)) if angles else 0.0
+
+def deskew(image, angle):
+    """
+    Rotate an image so text at `angle` degrees becomes horizontal.
+
+    The canvas is enlarged so no corner of the label is cut off.
+    """
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), -angle, 1.0)
+
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width = int(height * sin + width * cos)
+    new_height = int(height * cos + width * sin)
+    matrix[0, 2] += new_width / 2 - width / 2
+    matrix[1, 2] += new_height / 2 - height / 2
+
+    return cv2.warpAffine(image, matrix, (new_width, new_height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+def normalize_label_geometry(image):
+    """
+    Bring the nutrition table into a cropped, fronto-parallel, level view.
+
+    A table outline seen in perspective is warped to a rectangle, which also
+    crops to it. Otherwise the image is cropped to the detected table region
+    and rotated by the dominant text angle. This runs once per upload, before
+    any preprocessing variant is built.
+
+    Args:
+        image: BGR image as a NumPy array
+
+    Returns:
+        The normalized image (the original image if nothing was detected)
+    """
+    try:
+        corners = find_table_quad(image)
+    except cv2.error as e:
+        logger.warning(f"Table outline detection failed: {str(e)}")
+        corners = None
+
+    if corners is not None:
+        logger.info("Warped nutrition table to a fronto-parallel view")
+        return warp_to_quad(image, corners)
+
+    image = crop_to_nutrition_table(image)
+    try:
+        angle = estimate_skew(image)
+    except cv2.error as e:
+        logger.warning(f"Skew estimation failed: {str(e)}")
+        return image
+
+    if abs(angle) < OCR_SETTINGS['MIN_SKEW']:
+        return image
+    logger.info(f"Deskewing label by {angle:.1f} degrees")
+    return deskew(image, angle)
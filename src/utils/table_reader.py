@@ -0,0 +1,194 @@
+"""
+Layout-aware nutrition table reader.
+
+Reads nutrition values from tesseract word boxes instead of flattened
+text: words are grouped into rows by their vertical position and into
+cells by the gaps between them, each row's label is paired with the
+amounts on the same row, and amounts are assigned to the per-100g or
+per-serving column they sit under.
+"""
+import re
+import statistics
+from utils.nutrition_parser import find_nutrient, parse_amounts, normalize_amount
+
+PER_100G = 'per_100g'
+PER_SERVING = 'per_serving'
+
+_SERVING_WORDS = {'serving', 'serve', 'portion', 'pack', 'piece', 'biscuit'}
+_PERCENT_WORDS = {'%', 'rda', 'gda', 'dv', 'ri', '%rda', '%dv', '%gda', '%ri'}
+_HAS_DIGIT = re.compile(r'\d')
+_SERVING_SIZE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(g|gm|ml)\b', re.IGNORECASE)
+
+def _center_x(word):
+    return word.left + word.width / 2
+
+def group_rows(words):
+    """
+    Group word boxes into text rows.
+
+    A word joins the current row when its vertical centre lies within half a
+    typical word height of the row's centre.
+
+    Args:
+        words (list): WordBox tuples
+
+    Returns:
+        list: Rows, top to bottom, each a list of WordBox sorted left to right
+    """
+    if not words:
+        return []
+
+    tolerance = statistics.median(word.height for word in words) / 2
+    rows = []
+    row_center = None
+    for word in sorted(words, key=lambda w: w.top + w.height / 2):
+        center = word.top + word.height / 2
+        if rows and abs(center - row_center) <= tolerance:
+            rows[-1].append(word)
+            row_center += (center - row_center) / len(rows[-1])
+        else:
+            rows.append([word])
+            row_center = center
+
+    return [sorted(row, key=lambda w: w.left) for row in rows]
+
+def _cells(row, gap):
+    """Split a row into cells wherever the horizontal gap between words exceeds `gap`."""
+    cells = [[row[0]]]
+    for previous, word in zip(row, row[1:]):
+        if word.left - (previous.left + previous.width) > gap:
+            cells.append([word])
+        else:
+            cells[-1].append(word)
+    return cells
+
+def _find_columns(rows):
+    """
+    Find the x positions of the per-100g, per-serving and %RDA columns from a header row.
+
+    Returns:
+        tuple: ({column name: x centre}, serving size in grams or None)
+    """
+    for row in rows:
+        if find_nutrient(' '.join(word.text for word in row)):
+            continue  # A nutrient row, not a header
+
+        columns = {}
+        serving_size = None
+        for word in row:
+            text = word.text.lower().strip('()/:')
+            if text.startswith('100'):
+                columns.setdefault(PER_100G, _center_x(word))
+            elif text in _SERVING_WORDS or text.rstrip('s') in _SERVING_WORDS:
+                columns.setdefault(PER_SERVING, _center_x(word))
+            elif text in _PERCENT_WORDS:
+                columns.setdefault('percent', _center_x(word))
+            elif PER_SERVING in columns and serving_size is None:
+                # "Per serving (30g)": the serving size follows the header word
+                match = _SERVING_SIZE.search(word.text)
+                if match:
+                    serving_size = float(match.group(1).replace(',', '.'))
+
+        if PER_100G in columns or PER_SERVING in columns:
+            return columns, serving_size
+    return {}, None
+
+def _find_serving_size(rows):
+    """Find a "Serving size: 30g" line anywhere in the table."""
+    for row in rows:
+        text = ' '.join(word.text for word in row)
+        if 'serving size' in text.lower():
+            match = _SERVING_SIZE.search(text)
+            if match:
+                return float(match.group(1).replace(',', '.'))
+    return None
+
+def _pick_amount(nutrient, amounts):
+    """Choose the amount of a cell to report, preferring kcal over kJ for energy."""
+    converted = [normalize_amount(nutrient, value, unit) for value, unit in amounts]
+    converted = [(amount, unit) for amount, (_, unit) in zip(converted, amounts) if amount]
+    if not converted:
+        return None
+    if nutrient == 'energy_kcal':
+        for amount, unit in converted:
+            if unit != 'kj':
+                return amount
+    return converted[0][0]
+
+def read_table(words):
+    """
+    Read a nutrition table from OCR word boxes.
+
+    Args:
+        words (list): WordBox tuples from one OCR pass
+
+    Returns:
+        dict: {'per_100g': {nutrient: value}, 'per_serving': {nutrient: value},
+        'serving_size': grams or None}. Without a recognisable column header
+        the first amount of each row is taken as the per-100g value.
+    """
+    table = {PER_100G: {}, PER_SERVING: {}, 'serving_size': None}
+    rows = group_rows(words)
+    if not rows:
+        return table
+
+    columns, table['serving_size'] = _find_columns(rows)
+    if table['serving_size'] is None:
+        table['serving_size'] = _find_serving_size(rows)
+    gap = statistics.median(word.height for word in words)
+
+    for row in rows:
+        cells = _cells(row, gap)
+
+        # The label is everything before the first cell holding a number
+        label_cells = []
+        value_cells = []
+        for cell in cells:
+            if value_cells or _HAS_DIGIT.search(' '.join(w.text for w in cell)):
+                value_cells.append(cell)
+            else:
+                label_cells.append(cell)
+
+        nutrient = find_nutrient(' '.join(w.text for cell in label_cells for w in cell))
+        if nutrient is None or not value_cells:
+            continue
+
+        for position, cell in enumerate(value_cells):
+            picked = _pick_amount(nutrient, parse_amounts(' '.join(w.text for w in cell)))
+            if picked is None:
+                continue
+
+            if columns:
+                cell_x = sum(_center_x(w) for w in cell) / len(cell)
+                column = min(columns, key=lambda name: abs(columns[name] - cell_x))
+            else:
+                column = PER_100G if position == 0 else None
+            if column not in (PER_100G, PER_SERVING):
+                continue
+
+            key, value = picked
+            table[column].setdefault(key, value)
+
+    return table
+
+def read_nutrition(words):
+    """
+    Read per-100g nutrition values from OCR word boxes.
+
+    When the table states its serving size, per-serving values are scaled
+    to 100g for nutrients missing from the per-100g column.
+
+    Args:
+        words (list): WordBox tuples from one OCR pass
+
+    Returns:
+        dict: Nutrient values per 100g
+    """
+    table = read_table(words)
+    values = dict(table[PER_100G])
+
+    serving_size = table['serving_size']
+    if serving_size:
+        for key, value in table[PER_SERVING].items():
+            values.setdefault(key, round(value * 100 / serving_size, 2))
+    return values
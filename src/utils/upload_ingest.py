@@ -0,0 +1,145 @@
+"""
+Upload ingest utilities.
+
+Uploaded label photos are read into memory and decoded from there,
+downscaled to the OCR working resolution as they are decoded. The request
+as a whole is capped by Flask's MAX_CONTENT_LENGTH, which rejects an
+oversized body before werkzeug parses it; each file is then held to its
+own, smaller cap. A copy is only written to disk when the
+page needs to display it, under a content-addressed name so that two
+users uploading "image.jpg" never overwrite each other.
+"""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import cv2
+import numpy as np
+from PIL import Image
+from config.ocr import OCR_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 64 * 1024
+# Image dimensions are read from the first bytes only (JPEG EXIF blocks are at most 64 KB)
+_HEADER_BYTES = 256 * 1024
+
+# JPEG decoding can downscale by 2, 4 or 8 for a fraction of the full decode cost
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size cap."""
+
+class InvalidImage(Exception):
+    """Raised when an upload cannot be decoded as an image."""
+
+def read_upload(file_storage, max_bytes=None):
+    """
+    Read an uploaded file into memory, rejecting it if it exceeds the per-file cap.
+
+    werkzeug has already parsed the request body into `file_storage` by
+    the time this runs, so this bounds the copy held in memory, not what
+    was received; the request size itself is capped by MAX_CONTENT_LENGTH.
+
+    Args:
+        file_storage: werkzeug FileStorage from request.files
+        max_bytes (int): Size cap; defaults to OCR_SETTINGS['MAX_UPLOAD_BYTES']
+
+    Returns:
+        bytearray: The file contents
+
+    Raises:
+        UploadTooLarge: If the file is larger than max_bytes
+    """
+    if max_bytes is None:
+        max_bytes = OCR_SETTINGS['MAX_UPLOAD_BYTES']
+
+    data = bytearray()
+    while True:
+        chunk = file_storage.stream.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB")
+    return data
+
+def decode_image(data, max_side=None):
+    """
+    Decode an image from memory, downscaled so its longer side is at most max_side.
+
+    Large JPEGs are decoded at reduced size directly; the remaining scaling
+    is done with area interpolation.
+
+    Args:
+        data (bytes): Encoded image
+        max_side (int): Target longer side in pixels; defaults to
+            OCR_SETTINGS['DECODE_MAX_SIDE']
+
+    Returns:
+        BGR image as a NumPy array
+
+    Raises:
+        InvalidImage: If the data is not a decodable image
+    """
+    if max_side is None:
+        max_side = OCR_SETTINGS['DECODE_MAX_SIDE']
+
+    buffer = np.frombuffer(data, np.uint8)  # Shares memory with data, no copy
+
+    # Read the dimensions from the header only to pick a reduced decode
+    flag = cv2.IMREAD_COLOR
+    try:
+        with Image.open(io.BytesIO(data[:_HEADER_BYTES])) as header:
+            longest = max(header.size)
+    except Exception:
+        longest = 0
+    for factor, reduced_flag in _REDUCED_FLAGS:
+        if longest // factor >= max_side:
+            flag = reduced_flag
+            break
+
+    image = cv2.imdecode(buffer, flag)
+    if image is None:
+        raise InvalidImage("Uploaded file is not a readable image")
+
+    height, width = image.shape[:2]
+    if max(height, width) > max_side:
+        scale = max_side / max(height, width)
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return image
+
+def persist_upload(data, upload_folder, extension):
+    """
+    Write an upload to disk under a content-addressed name.
+
+    Identical uploads map to the same file and are only written once.
+
+    Args:
+        data (bytes): Encoded image
+        upload_folder (str): Directory the file is stored in
+        extension (str): File extension without the dot, e.g. 'jpg'
+
+    Returns:
+        tuple: (filename, path)
+    """
+    filename = f"{hashlib.sha256(data).hexdigest()}.{extension.lower()}"
+    path = os.path.join(upload_folder, filename)
+
+    if not os.path.exists(path):
+        os.makedirs(upload_folder, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+    return filename, path
@@ -0,0 +1,89 @@
+"""
+Offline tests of the Open Food Facts delta sync against the fixture delta files.
+"""
+import os
+import pytest
+from utils import off_sync
+from utils.off_mirror import ProductStore
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'off_delta')
+
+FIRST_END = 999986400
+LAST_END = 1000159200
+
+@pytest.fixture
+def store(tmp_path):
+    return ProductStore(str(tmp_path / 'mirror.sqlite3'))
+
+def test_list_deltas_orders_by_end_timestamp():
+    deltas = off_sync.list_deltas(FIXTURES)
+
+    # Numeric order, not name order, and index.txt is ignored
+    assert [end for _, end, _ in deltas] == [999986400, 1000072800, 1000159200]
+    assert deltas[0][2] == 'openfoodfacts_products_999900000_999986400.json'
+
+def test_sync_applies_every_file_and_advances_the_watermark(store):
+    summary = off_sync.sync_deltas(store, FIXTURES)
+
+    assert summary == {'files': 3, 'changed': 4, 'watermark': LAST_END, 'skipped': False}
+    assert int(store.get_state(off_sync.WATERMARK_KEY)) == LAST_END
+    assert store.get('8901719125478')['product_name'] == 'Marie Biscuits Lite'
+    assert store.get('8901063010017')['product_name'] == 'Roasted Makhana'
+    # Not sold in the mirrored countries and not mirrored before
+    assert store.get('4006381333931') is None
+
+def test_sync_is_a_no_op_when_up_to_date(store):
+    off_sync.sync_deltas(store, FIXTURES)
+
+    summary = off_sync.sync_deltas(store, FIXTURES)
+
+    assert summary['files'] == 0
+    assert summary['watermark'] == LAST_END
+
+def test_interrupted_sync_resumes_after_the_last_applied_file(store, monkeypatch):
+    apply_delta = off_sync.apply_delta
+    applied = []
+
+    def fail_on_second_file(store, path):
+        if len(applied) == 1:
+            raise OSError('connection lost')
+        applied.append(os.path.basename(path))
+        return apply_delta(store, path)
+
+    monkeypatch.setattr(off_sync, 'apply_delta', fail_on_second_file)
+    with pytest.raises(OSError):
+        off_sync.sync_deltas(store, FIXTURES)
+    assert int(store.get_state(off_sync.WATERMARK_KEY)) == FIRST_END
+
+    monkeypatch.setattr(off_sync, 'apply_delta', apply_delta)
+    summary = off_sync.sync_deltas(store, FIXTURES)
+
+    assert summary['files'] == 2
+    assert summary['watermark'] == LAST_END
+    assert store.get('8901719125478')['product_name'] == 'Marie Biscuits Lite'
+
+def test_stale_upserts_are_skipped(store):
+    changed = []
+    off_sync.sync_deltas(store, FIXTURES, on_change=changed.append)
+
+    # The last file carries an older copy of the ice cream than the first one
+    assert store.get('8901262173490')['product_name'] == 'Vanilla Ice Cream'
+    assert changed[2] == ['8901063010017']
+
+def test_reapplying_an_older_file_keeps_newer_products(store):
+    path = os.path.join(FIXTURES, 'openfoodfacts_products_999900000_999986400.json')
+    off_sync.apply_delta(store, path)
+    off_sync.apply_delta(store, os.path.join(FIXTURES, 'openfoodfacts_products_999986400_1000072800.json'))
+
+    assert off_sync.apply_delta(store, path) == ['8901262173490']
+    assert store.get('8901719125478')['product_name'] == 'Marie Biscuits Lite'
+
+@pytest.mark.skipif(off_sync.fcntl is None, reason='the sync lock needs fcntl')
+def test_sync_is_skipped_while_another_process_holds_the_lock(store):
+    with off_sync._exclusive_sync(store) as acquired:
+        assert acquired
+        summary = off_sync.sync_deltas(store, FIXTURES)
+
+    assert summary['skipped']
+    assert summary['files'] == 0
+    assert store.get_state(off_sync.WATERMARK_KEY) is None